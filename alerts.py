@@ -0,0 +1,252 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import requests
+
+
+class AlertRejected(Exception):
+    """The channel refused the alert; retrying will not help."""
+
+
+class PushoverTransport:
+    def __init__(self, token, user, url="https://api.pushover.net/1/messages.json", timeout=(3, 10)):
+        self.token = token
+        self.user = user
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        data = {
+            "token": self.token,
+            "user": self.user,
+            "message": alert['message'],
+        }
+        image_path = alert.get('image_path')
+        if image_path and os.path.exists(image_path):
+            with open(image_path, 'rb') as f:
+                files = {'attachment': (os.path.basename(image_path), f, 'image/jpeg')}
+                response = requests.post(self.url, data=data, files=files, timeout=self.timeout)
+        else:
+            response = requests.post(self.url, data=data, timeout=self.timeout)
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise AlertRejected(f"Pushover rejected alert: HTTP {response.status_code}")
+        response.raise_for_status()
+
+
+class FileSinkTransport:
+    """Appends alerts as JSON lines; handy for tests and offline deployments."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, alert):
+        record = dict(alert, sent_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+
+class RateLimiter:
+    """Token bucket: `rate` alerts per `per` seconds with bursts up to `burst`."""
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.interval = per / rate
+        self.burst = burst or rate
+        self.tokens = float(self.burst)
+        self.updated = time.time()
+
+    def reserve(self):
+        """Take a token and return 0, or return the seconds to wait for the next one."""
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) * self.interval
+
+
+class AlertDispatcher:
+    """Delivers alerts on a background thread so recognition requests never wait on the network.
+
+    send() only enqueues. The worker keeps a schedule of pending deliveries:
+    rate-limited alerts are pushed back until their channel has a token, and
+    failed deliveries are retried with exponential backoff up to max_attempts.
+    At most max_pending alerts are held; further alerts are dropped and counted.
+    """
+
+    def __init__(self, max_pending=200, max_attempts=4, backoff=2.0):
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._transports = {}
+        self._limiters = {}
+        self._inbox = queue.Queue()
+        self._schedule = []
+        self._seq = itertools.count()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0, 'rate_limited': 0}
+
+    def register(self, channel, transport, per_minute=None):
+        self._transports[channel] = transport
+        self._limiters[channel] = RateLimiter(per_minute) if per_minute else None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+                self._thread.start()
+
+    def send(self, message, image_path=None, channel='pushover'):
+        if channel not in self._transports:
+            logging.error(f"No alert transport registered for channel {channel}")
+            return False
+        with self._cond:
+            if self._pending >= self.max_pending:
+                self._stats['dropped'] += 1
+                return False
+            self._pending += 1
+            self._stats['queued'] += 1
+        self.start()
+        self._inbox.put({'channel': channel, 'message': message, 'image_path': image_path, 'attempts': 0})
+        return True
+
+    def _schedule_at(self, due, alert):
+        heapq.heappush(self._schedule, (due, next(self._seq), alert))
+
+    def _done(self, outcome):
+        with self._cond:
+            self._stats[outcome] += 1
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def _deliver(self, alert):
+        limiter = self._limiters.get(alert['channel'])
+        if limiter is not None:
+            wait = limiter.reserve()
+            if wait > 0:
+                with self._cond:
+                    self._stats['rate_limited'] += 1
+                self._schedule_at(time.time() + wait, alert)
+                return
+        try:
+            self._transports[alert['channel']].send(alert)
+        except AlertRejected as e:
+            logging.error(str(e))
+            self._done('failed')
+            return
+        except Exception as e:
+            alert['attempts'] += 1
+            if alert['attempts'] >= self.max_attempts:
+                logging.error(f"Giving up on {alert['channel']} alert after {alert['attempts']} attempts: {str(e)}")
+                self._done('failed')
+                return
+            with self._cond:
+                self._stats['retried'] += 1
+            self._schedule_at(time.time() + self.backoff * 2 ** (alert['attempts'] - 1), alert)
+            return
+        self._done('sent')
+
+    def _run(self):
+        while True:
+            timeout = max(0.0, self._schedule[0][0] - time.time()) if self._schedule else None
+            try:
+                self._schedule_at(time.time(), self._inbox.get(timeout=timeout))
+                while True:
+                    self._schedule_at(time.time(), self._inbox.get_nowait())
+            except queue.Empty:
+                pass
+            now = time.time()
+            while self._schedule and self._schedule[0][0] <= now:
+                self._deliver(heapq.heappop(self._schedule)[2])
+
+    def flush(self, timeout=None):
+        """Block until every queued alert is sent or has failed; returns False on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending
+        return stats
+
+
+class RecentEvents:
+    """Short-term memory of alerted faces, per route and camera.
+
+    A face that matches a remembered event (same user id, or an unknown whose
+    embedding is within match_distance) inside window_seconds of its last
+    sighting is folded into that event instead of raising a new alert.
+    """
+
+    def __init__(self, window_seconds=60, match_distance=0.9, max_per_key=64):
+        self.window = window_seconds
+        self.match_distance = match_distance
+        self.max_per_key = max_per_key
+        self._lock = threading.Lock()
+        self._events = {}
+
+    def _live(self, key, now):
+        events = [e for e in self._events.get(key, []) if now - e['last_seen'] <= self.window]
+        self._events[key] = events
+        return events
+
+    def match(self, key, embedding=None, user_id=None):
+        """Return the remembered event this face belongs to and mark it seen, or None."""
+        now = time.time()
+        with self._lock:
+            best, best_dist = None, self.match_distance
+            for event in self._live(key, now):
+                if user_id is not None or event['user_id'] is not None:
+                    if event['user_id'] == user_id:
+                        best = event
+                        break
+                    continue
+                dist = float(np.linalg.norm(event['embedding'] - embedding))
+                if dist <= best_dist:
+                    best, best_dist = event, dist
+            if best is not None:
+                best['last_seen'] = now
+                best['count'] += 1
+            return best
+
+    def remember(self, key, table, row_id, photo_path, quality, embedding=None, user_id=None):
+        now = time.time()
+        event = {
+            'table': table,
+            'row_id': row_id,
+            'photo_path': photo_path,
+            'quality': quality,
+            'embedding': None if embedding is None else np.asarray(embedding, dtype=np.float32),
+            'user_id': user_id,
+            'last_seen': now,
+            'count': 1,
+        }
+        with self._lock:
+            events = self._live(key, now)
+            events.append(event)
+            del events[:-self.max_per_key]
+        return event
+
+    def forget(self, key, event):
+        """Drop a remembered event whose row will not be written."""
+        with self._lock:
+            events = self._events.get(key, [])
+            if event in events:
+                events.remove(event)
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import threading
+import numpy as np
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0):
+    """Cluster unit vectors by cosine similarity and return unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    X = np.asarray(vectors, dtype=np.float32)
+    centroids = X[rng.choice(len(X), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = np.argmax(X @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        counts = np.bincount(labels, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty cells from random points so every list stays usable
+            sums[empty] = X[rng.choice(len(X), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+def rows_version(rows):
+    """Content fingerprint of a user's template rows, for galleries that have no row versions of their own."""
+    digest = hashlib.blake2b(np.ascontiguousarray(rows).tobytes(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') & 0x7FFFFFFFFFFFFFFF
+
+
+class IVFIndex:
+    """Inverted-file index over normalized embeddings.
+
+    A coarse quantizer assigns every template row to its nearest centroid; a
+    query only visits the nprobe closest lists and returns the owning user ids
+    as a shortlist. Final ranking is left to the caller so distances stay exact.
+
+    Each user's cells are stored with the version of the rows they were
+    assigned from, so sync() re-assigns a user whose templates were replaced
+    (e.g. re-enrolled in another process), not only users it has never seen.
+    """
+
+    def __init__(self, nlist=256, nprobe=16, dim=512):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.dim = dim
+        self.centroids = None
+        self._lock = threading.Lock()
+        self._lists = [np.empty(0, dtype=str) for _ in range(nlist)]
+        self._assigned = {}
+        self._versions = {}
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __contains__(self, user_id):
+        return user_id in self._assigned
+
+    def __len__(self):
+        return len(self._assigned)
+
+    def train(self, vectors, max_samples=None, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < self.nlist:
+            return False
+        max_samples = max_samples or self.nlist * 64
+        if len(vectors) > max_samples:
+            rng = np.random.default_rng(seed)
+            vectors = vectors[rng.choice(len(vectors), size=max_samples, replace=False)]
+        with self._lock:
+            self.centroids = spherical_kmeans(vectors, self.nlist, seed=seed)
+            self._lists = [np.empty(0, dtype=str) for _ in range(self.nlist)]
+            self._assigned = {}
+            self._versions = {}
+        return True
+
+    def _assign(self, rows):
+        return np.unique(np.argmax(np.atleast_2d(rows).astype(np.float32) @ self.centroids.T, axis=1))
+
+    def add(self, user_id, rows, version=None):
+        if not self.is_trained:
+            return
+        with self._lock:
+            self._remove_locked(user_id)
+            cells = self._assign(rows)
+            for cell in cells:
+                self._lists[cell] = np.append(self._lists[cell], user_id)
+            self._assigned[user_id] = cells
+            self._versions[user_id] = rows_version(rows) if version is None else version
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def _remove_locked(self, user_id):
+        cells = self._assigned.pop(user_id, None)
+        self._versions.pop(user_id, None)
+        if cells is None:
+            return
+        for cell in cells:
+            members = self._lists[cell]
+            self._lists[cell] = members[members != user_id]
+
+    def sync(self, blocks, versions=None):
+        """Bring assignments in line with a {user_id: rows} gallery, touching only the differences.
+
+        versions maps user ids to a number that changes whenever their rows do
+        (such as the row offset in an append-only store); users missing from it
+        are compared by a fingerprint of their rows.
+        """
+        if not self.is_trained:
+            return
+        versions = versions or {}
+        for user_id in [u for u in self._assigned if u not in blocks]:
+            self.remove(user_id)
+        for user_id, rows in blocks.items():
+            version = versions.get(user_id)
+            if version is None:
+                version = rows_version(rows)
+            if user_id not in self._assigned or self._versions.get(user_id) != version:
+                self.add(user_id, rows, version)
+
+    def search(self, queries, nprobe=None):
+        """Return one array of candidate user ids per query row."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        sims = queries @ self.centroids.T
+        probes = np.argpartition(-sims, nprobe - 1, axis=1)[:, :nprobe]
+        lists = self._lists
+        shortlists = []
+        for cells in probes:
+            parts = [lists[cell] for cell in cells]
+            shortlists.append(np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=str))
+        return shortlists
+
+    def save(self, path):
+        if not self.is_trained:
+            return
+        with self._lock:
+            user_ids = list(self._assigned)
+            cells = [self._assigned[u] for u in user_ids]
+            versions = np.array([self._versions.get(u, -1) for u in user_ids], dtype=np.int64)
+            owners = np.repeat(np.array(user_ids, dtype=str), [len(c) for c in cells])
+            flat = np.concatenate(cells) if cells else np.empty(0, dtype=np.int64)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, centroids=self.centroids, nprobe=self.nprobe, owners=owners, cells=flat,
+                         users=np.array(user_ids, dtype=str), versions=versions)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            centroids = data['centroids']
+            index = cls(nlist=len(centroids), nprobe=int(data['nprobe']), dim=centroids.shape[1])
+            index.centroids = centroids
+            owners, cells = data['owners'], data['cells']
+            # Indexes saved before versions were kept are re-assigned user by user on the first sync
+            if 'versions' in data.files:
+                index._versions = {u: int(v) for u, v in zip(data['users'].tolist(), data['versions'].tolist()) if v >= 0}
+        grouped = {}
+        for user_id, cell in zip(owners.tolist(), cells.tolist()):
+            grouped.setdefault(user_id, []).append(cell)
+        members = [[] for _ in range(index.nlist)]
+        for user_id, user_cells in grouped.items():
+            index._assigned[user_id] = np.array(user_cells, dtype=np.int64)
+            for cell in user_cells:
+                members[cell].append(user_id)
+        index._lists = [np.array(m, dtype=str) for m in members]
+        return index
+
+
+def measure_recall(matcher, queries, k=2, nprobe=None):
+    """Fraction of brute-force top-k users that the ANN path also returns."""
+    exact = matcher.match(queries, k=k, exact=True)
+    approx = matcher.match(queries, k=k, nprobe=nprobe)
+    hits = total = 0
+    for truth, found in zip(exact, approx):
+        found_ids = {user_id for _, user_id in found}
+        hits += sum(1 for _, user_id in truth if user_id in found_ids)
+        total += len(truth)
+    return hits / total if total else 1.0
@@ -1,21 +1,47 @@
+import atexit
+import hashlib
 import os
 import sqlite3
 import logging
 import pickle
 import random
 import smtplib
-import traceback
+import tempfile
 import time
 import warnings
 import json
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import click
 import cv2
 import numpy as np
-import requests
-from mtcnn import MTCNN
-from keras_facenet import FaceNet
-from flask import Flask, render_template, jsonify, request,flash,redirect,url_for
+from flask import Flask, Response, render_template, jsonify, request,flash,redirect,url_for,session
+from matcher import GalleryMatcher, select_templates
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore, migrate_from_table
+from models import ModelRegistry
+from inference import BatchingEmbedder
+from alerts import AlertDispatcher, PushoverTransport, FileSinkTransport, RecentEvents
+from tracking import TrackerRegistry
+from streaming import StreamHub, FrameTooLarge
+from capture import CaptureManager
+from motion import MotionGates
+from db import Database, full_table_scans
+from migrations import migrate, schema_version, rebuild_summaries, data_version
+from presence import DailyPresence
+from feeds import EventFeed, FeedCursorError, CommittedEvents
+from writer import EventWriter
+from broker import EventBroker, BrokerFull, sse_message
+from cache import ResponseCache
+from photos import PhotoStore, thumbnail_path
+from pipeline import Pipeline, FrameContext, StopFrame
+from detectors import (detect_downscaled, scale_face, benchmark, HaarDetector, DnnDetector, CascadeDetector,
+                       DetectorRegistry)
+try:
+    from flask_sock import Sock
+except ImportError:  # streaming is optional; the monitors fall back to per-frame POSTs
+    Sock = None
 
 logging.disable(logging.CRITICAL)
 warnings.filterwarnings('ignore')
@@ -24,139 +50,426 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024
 app.secret_key = "hostel_secret"
+# Load and warm the face models in the background once the server takes its first request
+app.config['MODEL_WARMUP'] = True
 DATASET_DIR = 'dataset'
 PROFILE_PIC_DIR = 'static/profile_pics'
 EMBEDDINGS_DIR = 'embeddings'
 VISITOR_PHOTO_DIR = 'static/visitor_photos'
-embedder = FaceNet()
-detector = MTCNN()
+# Visitor and breach photos go into dated folders under VISITOR_PHOTO_DIR, named by content
+# hash, with a THUMBNAIL_SIZE px thumbnail beside each for the list views. They are encoded
+# and written by a background thread; the event writer waits at most PHOTO_WRITE_TIMEOUT
+# seconds for a row's photo, before opening its transaction, and then commits the row anyway.
+PHOTO_JPEG_QUALITY = 85
+THUMBNAIL_SIZE = 160
+THUMBNAIL_JPEG_QUALITY = 70
+PHOTO_WRITE_TIMEOUT = 5
+photo_store = PhotoStore(VISITOR_PHOTO_DIR, quality=PHOTO_JPEG_QUALITY, thumb_size=THUMBNAIL_SIZE,
+                         thumb_quality=THUMBNAIL_JPEG_QUALITY)
+# One pool of WAL-mode connections shared by routes, capture workers and stream sessions.
+# busy_timeout lets a writer wait out another writer's short transaction instead of
+# failing with "database is locked".
+DATABASE_PATH = 'hostel.db'
+DB_BUSY_TIMEOUT_MS = 5000
+DB_SYNCHRONOUS = 'NORMAL'
+DB_CACHE_KIB = 16384
+db = Database(DATABASE_PATH, busy_timeout_ms=DB_BUSY_TIMEOUT_MS, synchronous=DB_SYNCHRONOUS,
+              cache_size_kib=DB_CACHE_KIB)
+models = ModelRegistry()
+# Face crops from concurrent requests are embedded together in one model call
+INFERENCE_MAX_BATCH = 32
+INFERENCE_MAX_WAIT_MS = 5
+INFERENCE_MAX_QUEUE = 256
+face_embedder = BatchingEmbedder(lambda faces: models.embedder.embeddings(faces),
+                                 max_batch=INFERENCE_MAX_BATCH,
+                                 max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                                 max_queue=INFERENCE_MAX_QUEUE)
+# Face detector backend for recognition routes: 'mtcnn', 'haar', 'dnn' (OpenCV res10 SSD from
+# DNN_DETECTOR_FILES) or 'cascade' (Haar proposes, MTCNN confirms). Override per route in
+# ROUTE_DETECTORS, e.g. {'intrusion': 'cascade'}, or per camera in the cameras table.
 DETECTOR_TYPE = 'mtcnn'
-EMBEDDINGS_CACHE = {}
+ROUTE_DETECTORS = {}
+DNN_DETECTOR_FILES = ('detector_models/deploy.prototxt', 'detector_models/res10_300x300_ssd_iter_140000.caffemodel')
+face_detectors = DetectorRegistry({
+    'mtcnn': lambda: models.detector,
+    'haar': HaarDetector,
+    'dnn': lambda: DnnDetector(*DNN_DETECTOR_FILES),
+    'cascade': lambda: CascadeDetector(face_detectors.get('haar'), models.detector),
+})
+# 'average' keeps one mean embedding per user, 'templates' keeps per-image embeddings
+GALLERY_MODE = 'average'
+# Memory budget for the gallery: storage precision and templates kept per user (k-medoids subset)
+GALLERY_DTYPE = np.float32
+MAX_TEMPLATES_PER_USER = 8
+# Optional IVF index for large galleries; shortlists are re-ranked exactly
+ANN_ENABLED = False
+ANN_INDEX_PATH = os.path.join(EMBEDDINGS_DIR, 'ann_index.npz')
+EMBEDDINGS_STORE_PATH = os.path.join(EMBEDDINGS_DIR, 'gallery.emb')
+ANN_NLIST = 256
+ANN_NPROBE = 16
+ANN_MIN_USERS = 2000
+gallery = GalleryMatcher(dtype=GALLERY_DTYPE, max_templates=MAX_TEMPLATES_PER_USER, ann_min_users=ANN_MIN_USERS)
 threshold=0.9
 
 os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
 os.makedirs(PROFILE_PIC_DIR, exist_ok=True)
 os.makedirs(VISITOR_PHOTO_DIR, exist_ok=True)
 
+PUSHOVER_API_TOKEN = "YOUR_API_TOKEN"
+PUSHOVER_USER_KEY = "YOUR_USER_KEY"
+PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+PUSHOVER_RATE_PER_MINUTE = 20
+# 'pushover' sends real notifications, 'file' appends them to ALERT_FILE_SINK instead
+ALERT_TRANSPORT = 'pushover'
+ALERT_FILE_SINK = 'alerts.log'
+ALERT_MAX_PENDING = 200
+ALERT_MAX_ATTEMPTS = 4
+
+alert_dispatcher = AlertDispatcher(max_pending=ALERT_MAX_PENDING, max_attempts=ALERT_MAX_ATTEMPTS)
+if ALERT_TRANSPORT == 'file':
+    alert_dispatcher.register('pushover', FileSinkTransport(ALERT_FILE_SINK))
+else:
+    alert_dispatcher.register('pushover', PushoverTransport(PUSHOVER_API_TOKEN, PUSHOVER_USER_KEY, url=PUSHOVER_URL),
+                              per_minute=PUSHOVER_RATE_PER_MINUTE)
+
 def send_pushover_alert(message, image_path=None):
-    token = "YOUR_USER_KEY"
-    user = "YOUR_API_TOKEN"
-    data = {
-        "token": token,
-        "user": user,
-        "message": message,
+    # Queued for the background dispatcher; the caller never waits on the network
+    return alert_dispatcher.send(message, image_path=image_path, channel='pushover')
+
+# A face seen again within this window updates its existing event instead of raising a new one
+ALERT_COALESCE_SECONDS = 60
+recent_events = RecentEvents(window_seconds=ALERT_COALESCE_SECONDS, match_distance=threshold)
+
+# Dashboards subscribe to /live_events instead of polling. Each client gets a buffer of
+# LIVE_CLIENT_BUFFER messages; one that falls that far behind is dropped and reconnects.
+LIVE_CLIENT_BUFFER = 100
+LIVE_MAX_CLIENTS = 50
+LIVE_KEEPALIVE_SECONDS = 15
+LIVE_TOPICS = ('attendance', 'visitor', 'breach', 'stats')
+event_broker = EventBroker(buffer_size=LIVE_CLIENT_BUFFER, max_clients=LIVE_MAX_CLIENTS)
+committed_events = CommittedEvents()
+
+def dashboard_counts(conn):
+    # The figures on /home, read from the summary tables kept by triggers (see migrations.py)
+    counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+    today = datetime.now().strftime('%Y-%m-%d')
+    row = conn.execute("SELECT present FROM daily_stats WHERE date = ?", (today,)).fetchone()
+    return {
+        'total_hostelites': counters.get('users', 0),
+        'today_attendance': row[0] if row else 0,
+        'unauthorized_visits': counters.get('open_visitors', 0),
+        'geo_fence_alerts': counters.get('open_breaches', 0),
     }
-    files = {}
-    if image_path and os.path.exists(image_path):
-        with open(image_path, 'rb') as f:
-            files['attachment'] = (os.path.basename(image_path), f, 'image/jpeg')
-            response = requests.post("https://api.pushover.net/1/messages.json", data=data, files=files)
-    else:
-        response = requests.post("https://api.pushover.net/1/messages.json", data=data)
-    return response.status_code == 200
 
-def load_embeddings_cache():
-    conn = sqlite3.connect('hostel.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT user_id, embedding FROM embeddings')
-    for user_id, emb_blob in cursor.fetchall():
-        EMBEDDINGS_CACHE[user_id] = pickle.loads(emb_blob) / np.linalg.norm(pickle.loads(emb_blob))
+def publish_committed_events(conn, batch=500):
+    # Runs on the writer thread right after a commit, so every event pushed is already readable
+    published = False
+    while True:
+        events = committed_events.take(conn, limit=batch)
+        for event in events:
+            event_broker.publish(event['kind'], event, event_id=event['id'])
+        published = published or bool(events)
+        if len(events) < batch:
+            break
+    if published and event_broker.clients:
+        event_broker.publish('stats', dashboard_counts(conn))
+
+# Event rows are committed by a background writer in groups: everything queued within
+# EVENT_WRITER_MAX_DELAY_MS, or up to EVENT_WRITER_MAX_BATCH rows, shares one transaction.
+# 'async' durability answers the frame once its rows are queued (a crash can lose the
+# uncommitted window); 'sync' answers only after the commit.
+EVENT_WRITER_MAX_BATCH = 200
+EVENT_WRITER_MAX_DELAY_MS = 50
+EVENT_WRITER_MAX_QUEUE = 2000
+EVENT_WRITER_DURABILITY = 'async'
+event_writer = EventWriter(db, max_batch=EVENT_WRITER_MAX_BATCH, max_delay_ms=EVENT_WRITER_MAX_DELAY_MS,
+                           max_queue=EVENT_WRITER_MAX_QUEUE, durability=EVENT_WRITER_DURABILITY,
+                           after_timeout=PHOTO_WRITE_TIMEOUT, on_commit=publish_committed_events)
+# Commit whatever is still queued when the server exits
+atexit.register(event_writer.flush, 10)
+
+def present_user_ids(date):
+    conn = db.connect()
+    rows = conn.execute('SELECT user_id FROM attendance WHERE date = ?', (date,)).fetchall()
     conn.close()
-    logging.debug(f"Loaded {len(EMBEDDINGS_CACHE)} embeddings into cache")
+    return [row[0] for row in rows]
+
+# Users already marked present today; repeat recognitions are answered without a query
+daily_presence = DailyPresence(present_user_ids)
+
+def face_quality(face_crop):
+    # Bigger and sharper crops make better evidence photos
+    if face_crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var() * min(gray.shape))
+
+def keep_best_photo(event, face_crop):
+    """Store the crop if it beats the event's photo so far; returns the StoredPhoto or None.
+
+    The better crop gets its own content-hashed file and the row is pointed at it. The old
+    file is left alone, since another event with the same crop may share it.
+    """
+    quality = face_quality(face_crop)
+    if quality <= event['quality']:
+        return None
+    photo = photo_store.save(face_crop, event['prefix'])
+    event['photo_path'] = photo.path
+    event['quality'] = quality
+    return photo
+
+def update_sighting(cursor, table, event, photo_path):
+    cursor.execute(f'UPDATE {table} SET last_seen = ?, seen_count = ?, photo_path = ? WHERE id = ?',
+                   (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), event['count'], photo_path, event['row_id']))
+
+embedding_store = None
 
-load_embeddings_cache()
+def load_embeddings_cache():
+    global embedding_store
+    needs_migration = not os.path.exists(EMBEDDINGS_STORE_PATH)
+    embedding_store = EmbeddingStore(EMBEDDINGS_STORE_PATH)
+    if needs_migration:
+        conn = db.connect()
+        migrated = migrate_from_table(embedding_store, conn)
+        conn.close()
+        logging.debug(f"Migrated {migrated} embeddings from the embeddings table to {EMBEDDINGS_STORE_PATH}")
+    if ANN_ENABLED:
+        if os.path.exists(ANN_INDEX_PATH):
+            gallery.index = IVFIndex.load(ANN_INDEX_PATH)
+        else:
+            gallery.index = IVFIndex(nlist=ANN_NLIST, nprobe=ANN_NPROBE)
+    gallery.attach(*embedding_store.live())
+    if ANN_ENABLED and not gallery.index.is_trained and len(gallery) >= ANN_MIN_USERS:
+        gallery.train_index()
+    if ANN_ENABLED:
+        gallery.index.save(ANN_INDEX_PATH)
+    logging.debug(f"Loaded {len(gallery)} embeddings into gallery")
+
+def refresh_gallery():
+    # Another worker may have enrolled or removed users since we last mapped the store
+    if embedding_store.changed():
+        embedding_store.refresh()
+        gallery.attach(*embedding_store.live())
+
+# Faces that stay put across frames of one camera reuse their last embedding and match.
+# Overlapping boxes only mean the same face when frames arrive close together: streams send
+# every 200-500 ms, the POST fallback every 5-8 s, by which time the next person at a kiosk or
+# gate can be standing in the same spot. A track is re-embedded when the gap since it was last
+# seen exceeds TRACK_MAX_GAP_SECONDS, and dropped after TRACK_TTL_SECONDS.
+TRACK_TTL_SECONDS = 2
+TRACK_MAX_GAP_SECONDS = 1
+TRACK_REVERIFY_SECONDS = 30
+TRACK_REEMBED_IOU = 0.6
+face_trackers = TrackerRegistry(ttl_seconds=TRACK_TTL_SECONDS, reverify_seconds=TRACK_REVERIFY_SECONDS,
+                                reembed_iou=TRACK_REEMBED_IOU, max_gap_seconds=TRACK_MAX_GAP_SECONDS)
+
+def decode_frame(frame):
+    """Accept JPEG bytes from uploads and streams, or a BGR array from capture workers."""
+    if isinstance(frame, np.ndarray) and frame.ndim == 3:
+        return frame
+    return cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+
+# Frame differencing per camera; static scenes skip the face detector entirely
+MOTION_GATING = True
+MOTION_THRESHOLD = 25  # per-pixel change (0-255) that counts as motion
+MOTION_MIN_AREA = 0.002  # fraction of the frame that must change
+MOTION_MAX_IDLE_SECONDS = 10  # run a full detection at least this often
+MOTION_RESTRICT_TO_REGIONS = True
+motion_gates = MotionGates(threshold=MOTION_THRESHOLD, min_area=MOTION_MIN_AREA,
+                           max_idle_seconds=MOTION_MAX_IDLE_SECONDS)
+
+# MTCNN runs on a copy shrunk to this width; boxes are mapped back and crops come from the full frame
+DETECTION_DOWNSCALE = True
+DETECTION_TARGET_WIDTH = 640
+DETECTION_MIN_FACE_SIZE = 40  # full-resolution pixels; smaller faces are ignored
+
+def run_detector(img_rgb, dx=0, dy=0, detector=None):
+    backend = face_detectors.get(detector or DETECTOR_TYPE)
+    if DETECTION_DOWNSCALE:
+        return detect_downscaled(backend, img_rgb, DETECTION_TARGET_WIDTH, DETECTION_MIN_FACE_SIZE, dx, dy)
+    return [scale_face(face, 1.0, dx, dy) for face in backend.detect_faces(img_rgb)]
+
+def detect_faces(session_key, img_rgb, detector=None):
+    """Detect faces where the camera saw motion; returns None if nothing moved."""
+    detector = detector or ROUTE_DETECTORS.get(session_key[0], DETECTOR_TYPE)
+    regions = motion_gates.check(session_key, img_rgb) if MOTION_GATING else []
+    if regions is None:
+        return None
+    if not regions or not MOTION_RESTRICT_TO_REGIONS:
+        return run_detector(img_rgb, detector=detector)
+    faces = []
+    for rx, ry, rw, rh in regions:
+        faces.extend(run_detector(np.ascontiguousarray(img_rgb[ry:ry+rh, rx:rx+rw]), rx, ry, detector))
+    return faces
+
+# Stages shared by the recognition pipelines. Each takes the FrameContext of one frame.
+
+def db_cursor(ctx):
+    if ctx.conn is None:
+        ctx.conn = db.connect()
+    return ctx.conn.cursor()
+
+def recognition_seconds(ctx):
+    # What used to be reported as detection speed: detection through gallery matching
+    return sum(ctx.timings.get(stage, 0.0) for stage in ('detect', 'filter', 'crop', 'embed', 'match'))
+
+def decode_stage(ctx):
+    ctx.img = decode_frame(ctx.frame)
+    if ctx.img is None:
+        logging.error("Failed to decode image")
+        raise StopFrame({"status": "error", "message": "Failed to decode image"}, 400)
+    ctx.img_rgb = cv2.cvtColor(ctx.img, cv2.COLOR_BGR2RGB)
+
+def detect_stage(ctx):
+    faces = detect_faces(ctx.session_key, ctx.img_rgb, ctx.options.get('detector'))
+    if faces is None:
+        raise StopFrame({"status": "success", "message": "No motion detected", "motion_skipped": True})
+    logging.debug(f"Detected {len(faces)} faces")
+    ctx.faces = faces
+
+def confidence_filter_stage(ctx):
+    if not ctx.faces:
+        raise StopFrame({"status": "error", "message": "No faces detected"}, 400)
+    for i, face in enumerate(ctx.faces):
+        if face['confidence'] < 0.9:
+            logging.debug(f"Face {i+1} skipped due to low confidence: {face['confidence']}")
+            ctx.messages.append(f"Face {i+1} skipped (low confidence)")
+            continue
+        x, y, w, h = face['box']
+        ctx.boxes.append((x, y, w, h))
+    if not ctx.boxes:
+        raise StopFrame({"status": "error", "message": "No valid faces detected"}, 400)
+
+def crop_stage(ctx):
+    # Faces still tracked from earlier frames keep their embedding; only the rest are cropped
+    ctx.assignments = face_trackers.get(ctx.session_key).assign(ctx.boxes)
+    ctx.fresh = [j for j, (_, stale) in enumerate(ctx.assignments) if stale]
+    ctx.crops = np.array([cv2.resize(ctx.img_rgb[y:y+h, x:x+w], (160, 160))
+                          for x, y, w, h in (ctx.boxes[j] for j in ctx.fresh)])
+
+def embed_stage(ctx):
+    if ctx.fresh:
+        embeddings = face_embedder.embeddings(ctx.crops)
+        ctx.fresh_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def match_stage(ctx):
+    if ctx.fresh:
+        refresh_gallery()
+        tracker = face_trackers.get(ctx.session_key)
+        for j, embedding, distances in zip(ctx.fresh, ctx.fresh_embeddings, gallery.match(ctx.fresh_embeddings, k=2)):
+            tracker.remember(ctx.assignments[j][0], embedding, distances)
+    face_trackers.record(len(ctx.boxes), len(ctx.fresh))
+    ctx.embeddings = np.array([track.embedding for track, _ in ctx.assignments])
+    ctx.matches = [track.matches for track, _ in ctx.assignments]
+    ctx.skipped = len(ctx.boxes) - len(ctx.fresh)
+
+def new_event(ctx, table, prefix, face, face_crop, alert, columns, embedding=None, user_id=None):
+    ctx.writes.append({'op': 'event', 'table': table, 'prefix': prefix, 'face': face, 'crop': face_crop,
+                       'alert': alert, 'columns': columns, 'embedding': embedding, 'user_id': user_id})
+
+def repeat_event(ctx, table, face_crop, embedding=None, user_id=None):
+    """Fold the face into a recent event if it is one; returns the event or None."""
+    event = recent_events.match(ctx.session_key, embedding=embedding, user_id=user_id)
+    if event is not None:
+        ctx.writes.append({'op': 'repeat', 'table': table, 'event': event, 'crop': face_crop})
+    return event
+
+def insert_event_op(table, columns, event):
+    def op(cursor):
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                       tuple(columns.values()))
+        # Repeat sightings queued behind this insert update the row through the remembered event
+        event['row_id'] = cursor.lastrowid
+        logging.debug(f"Saved {table} event {cursor.lastrowid} with photo {columns['photo_path']}")
+    return op
+
+def persist_stage(ctx):
+    if not ctx.writes:
+        return
+    # Rows carry the timings of every stage up to this one
+    stage_timings = json.dumps(ctx.timings_ms())
+    ops = []
+    photos = []
+    attendance_rows = []
+    remembered = []
+
+    def discard(error):
+        # Give back the presence claims made by the policy so the next sighting retries the insert,
+        # and forget events whose rows will never exist so later sightings raise their own
+        for write in ctx.writes:
+            if write['op'] == 'attendance':
+                daily_presence.release(write['row'][0], write['row'][1])
+        for event in remembered:
+            recent_events.forget(ctx.session_key, event)
 
-def init_db():
-    conn = sqlite3.connect('hostel.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT UNIQUE NOT NULL,
-            role TEXT NOT NULL,
-            name TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            contact TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            profile_pic TEXT,
-            dataset_folder TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS role_counters (
-            role TEXT PRIMARY KEY,
-            counter INTEGER DEFAULT 0
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS embeddings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            embedding BLOB NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            status TEXT NOT NULL,
-            confidence REAL,
-            detected_speed REAL,  -- Added detected_speed column
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
-            UNIQUE(user_id, date)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS visitors (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            photo_path TEXT NOT NULL,
-            status TEXT DEFAULT 'Visitor',
-            confidence REAL,
-            detected_speed REAL  -- Added detected_speed column
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS geo_fence (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            photo_path TEXT NOT NULL,
-            status TEXT DEFAULT 'Zone Breach',
-            user_id TEXT
-        )
-    ''')
+    try:
+        for write in ctx.writes:
+            if write['op'] == 'repeat':
+                photo = keep_best_photo(write['event'], write['crop'])
+                if photo is not None:
+                    photos.append(photo.future)
+                # The path is taken now: a later frame may already point the event at a photo still being written
+                ops.append(lambda cursor, write=write, path=write['event']['photo_path']:
+                           update_sighting(cursor, write['table'], write['event'], path))
+            elif write['op'] == 'attendance':
+                attendance_rows.append(write['row'] + (stage_timings,))
+            else:
+                photo = photo_store.save(write['crop'], write['prefix'])
+                photo_path = photo.path
+                seen_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                columns = dict(write['columns'], timestamp=seen_at, photo_path=photo_path, last_seen=seen_at,
+                               seen_count=1, stage_timings=stage_timings)
+                # Remembered before the row exists so a repeat sighting in the next frame is still coalesced
+                event = recent_events.remember(ctx.session_key, write['table'], None, photo_path, face_quality(write['crop']),
+                                               embedding=write['embedding'], user_id=write['user_id'])
+                remembered.append(event)
+                event['prefix'] = write['prefix']
+                ops.append(insert_event_op(write['table'], columns, event))
+                photos.append(photo.future)
+                ctx.alerts.append((write['alert'], photo))
+        if attendance_rows:
+            # Another worker process may have marked the same user first; UNIQUE(user_id, date) decides
+            ops.append(lambda cursor: cursor.executemany(
+                'INSERT OR IGNORE INTO attendance (user_id, date, time, status, confidence, detected_speed, stage_timings) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                attendance_rows))
+        # Rows are only committed once their photos are on disk, so nothing that reads them
+        # (feeds, live events, the notifications page) points at a missing file
+        event_writer.submit(ops, on_error=discard, after=photos)
+    except Exception as e:
+        # Nothing was queued (or, with sync durability, the commit failed): the writer's on_error
+        # may not have run, and releasing twice is harmless
+        discard(e)
+        raise
+
+
+def alert_stage(ctx):
+    for message, photo in ctx.alerts:
+        # The notification attaches the photo, so it is queued once the file has been written
+        photo.future.add_done_callback(
+            lambda _, message=message, path=photo.path: send_pushover_alert(message=message, image_path=path))
+
+RECOGNITION_STAGES = {
+    'decode': decode_stage,
+    'detect': detect_stage,
+    'filter': confidence_filter_stage,
+    'crop': crop_stage,
+    'embed': embed_stage,
+    'match': match_stage,
+    'persist': persist_stage,
+    'alert': alert_stage,
+}
 
-    roles = ['hostelite', 'warden', 'support_staff']
-    for role in roles:
-        cursor.execute('INSERT OR IGNORE INTO role_counters (role, counter) VALUES (?, 0)', (role,))
-    
-    # Ensure status, confidence, and detected_speed columns exist in visitors table
-    cursor.execute("PRAGMA table_info(visitors)")
-    columns = [col[1] for col in cursor.fetchall()]
-    if 'status' not in columns:
-        cursor.execute('ALTER TABLE visitors ADD COLUMN status TEXT DEFAULT "Visitor"')
-    if 'confidence' not in columns:
-        cursor.execute('ALTER TABLE visitors ADD COLUMN confidence REAL')
-    if 'detected_speed' not in columns:
-        cursor.execute('ALTER TABLE visitors ADD COLUMN detected_speed REAL')
-    
-    # Ensure confidence and detected_speed columns exist in attendance table
-    cursor.execute("PRAGMA table_info(attendance)")
-    columns = [col[1] for col in cursor.fetchall()]
-    if 'confidence' not in columns:
-        cursor.execute('ALTER TABLE attendance ADD COLUMN confidence REAL')
-    if 'detected_speed' not in columns:
-        cursor.execute('ALTER TABLE attendance ADD COLUMN detected_speed REAL')
-    
-    conn.commit()
+def init_db():
+    conn = db.connect()
+    applied = migrate(conn)
+    if applied:
+        logging.debug(f"Database schema now at version {schema_version(conn)}")
+    # Live clients are only told about events committed from here on
+    committed_events.seek(conn)
     conn.close()
 
 def generate_user_id(role):
-    conn = sqlite3.connect('hostel.db')
+    conn = db.connect()
     cursor = conn.cursor()
     cursor.execute('SELECT counter FROM role_counters WHERE role = ?', (role,))
     result = cursor.fetchone()
@@ -168,45 +481,146 @@ def generate_user_id(role):
     return user_id
 
 init_db()
+load_embeddings_cache()
 
 active_otps = {}
 
+@app.before_request
+def start_model_warmup():
+    if app.config['MODEL_WARMUP']:
+        models.start_warmup()
+
+def models_warming_up():
+    return jsonify({
+        "status": "warming_up",
+        "message": "Recognition models are warming up, please retry shortly",
+        "models": models.status()
+    }), 503
+
+def requires_models(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not models.ready:
+            return models_warming_up()
+        return view(*args, **kwargs)
+    return wrapper
+
+# Report views are answered from this cache while the tables they read are unchanged, and
+# carry an ETag so a client polling an unchanged view gets a 304 without a body
+RESPONSE_CACHE_ENTRIES = 256
+RESPONSE_CACHE_TTL = 300
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_ENTRIES, ttl=RESPONSE_CACHE_TTL)
+
+def build_version():
+    # Changes whenever the code or templates do, so a deploy never answers 304 with old markup
+    digest = hashlib.sha1()
+    templates = os.path.join(app.root_path, app.template_folder)
+    sources = [os.path.abspath(__file__)] + sorted(
+        os.path.join(folder, name) for folder, _, names in os.walk(templates) for name in names)
+    for path in sources:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+BUILD_VERSION = build_version()
+
+def versioned_view(*tables, daily=False):
+    """Cache the view's response per arguments and data version of tables, and honour If-None-Match.
+
+    daily views also show what happens to be today, so the date is part of their version.
+    Pages include base.html, which renders flashed messages from the session: a request with
+    flashes pending bypasses the cache so they are shown once, and entries are kept per
+    session user with Vary: Cookie so shared caches keep them apart too.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+            # Read before the view runs: a write landing in between leaves a newer body under
+            # the older version, which the next request simply misses
+            conn = db.connect()
+            try:
+                versions = data_version(conn, tables)
+            finally:
+                conn.close()
+            key = (BUILD_VERSION, request.endpoint, session.get('user_id'), tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))), versions)
+            if daily:
+                key += (datetime.now().strftime('%Y-%m-%d'),)
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+            if request.if_none_match.contains_weak(etag):
+                response_cache.not_modified()
+                response = app.response_class(status=304)
+            else:
+                cached = response_cache.get(key)
+                if cached is not None:
+                    response = app.response_class(cached[0], content_type=cached[1])
+                else:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response_cache.put(key, (response.get_data(), response.content_type))
+            response.set_etag(etag, weak=True)
+            # Browsers revalidate every time instead of guessing a freshness lifetime
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+@app.route('/model_status')
+def model_status():
+    status = models.status()
+    status['inference'] = face_embedder.metrics()
+    status['alerts'] = alert_dispatcher.stats()
+    status['tracking'] = face_trackers.metrics()
+    status['motion'] = motion_gates.metrics()
+    status['pipelines'] = {p.name: p.metrics() for p in (attendance_pipeline, intrusion_pipeline, geo_fence_pipeline)}
+    status['streams'] = stream_hub.metrics()
+    status['cameras'] = capture_manager.metrics()
+    status['database'] = db.stats()
+    status['presence'] = daily_presence.metrics()
+    status['event_writer'] = event_writer.metrics()
+    status['live_events'] = event_broker.metrics()
+    status['response_cache'] = response_cache.metrics()
+    status['photos'] = photo_store.metrics()
+    return jsonify(status)
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'GET':
         return render_template('login.html')
 
     if 'image' in request.files:  # Facial login
+        if not models.ready:
+            return models_warming_up()
         try:
             img_file = request.files['image']
             img_data = np.frombuffer(img_file.read(), np.uint8)
             img = cv2.imdecode(img_data, cv2.IMREAD_COLOR)
             img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-            faces = detector.detect_faces(img_rgb)
+            faces = models.detector.detect_faces(img_rgb)
             if not faces:
                 return jsonify({"status": "error", "message": "No face detected"})
 
             face = faces[0]
+            refresh_gallery()
             x, y, w, h = face['box']
             face_img = img_rgb[y:y+h, x:x+w]
             face_img = cv2.resize(face_img, (160, 160))
-            embedding = embedder.embeddings(np.expand_dims(face_img, axis=0))[0]
+            embedding = face_embedder.embeddings(np.expand_dims(face_img, axis=0))[0]
             embedding = embedding / np.linalg.norm(embedding)
 
-            min_dist = float('inf')
-            matched_user_id = None
-            for user_id, stored_emb in EMBEDDINGS_CACHE.items():
-                dist = np.linalg.norm(embedding - stored_emb)
-                if dist < min_dist:
-                    min_dist = dist
-                    matched_user_id = user_id
+            distances = gallery.match(embedding, k=1)[0]
+            min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
 
             if min_dist > 1.1 or matched_user_id is None:
                 return jsonify({"status": "error", "message": "Face not recognized"})
 
             # Verify role
-            conn = sqlite3.connect('hostel.db')
+            conn = db.connect()
             cursor = conn.cursor()
             cursor.execute("SELECT name, role FROM users WHERE user_id = ?", (matched_user_id,))
             row = cursor.fetchone()
@@ -222,7 +636,7 @@ def login():
         user_id = data.get("user_id")
         email = data.get("email")
 
-        conn = sqlite3.connect('hostel.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute("SELECT email, name, role FROM users WHERE user_id = ?", (user_id,))
         row = cursor.fetchone()
@@ -288,40 +702,23 @@ def index():
 
 @app.route('/home')
 def home():
-    conn = sqlite3.connect('hostel.db')
+    conn = db.connect()
     cursor = conn.cursor()
     
-    # Total Hostelites
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_hostelites = cursor.fetchone()[0]
+    # Counts come from the summary tables kept by triggers, so this page costs the same however long the history
+    counts = dashboard_counts(conn)
     
-    # Today's Attendance
-    today = datetime.now().strftime('%Y-%m-%d')
-    cursor.execute("SELECT COUNT(*) FROM attendance WHERE date = ? AND status = 'Present'", (today,))
-    today_attendance = cursor.fetchone()[0]
-    
-    # Unauthorized Visits
-    cursor.execute("SELECT COUNT(*) FROM visitors WHERE status = 'Visitor'")
-    unauthorized_visits = cursor.fetchone()[0]
-    
-    # Geo-Fencing Alerts
-    cursor.execute("SELECT COUNT(*) FROM geo_fence WHERE status = 'Zone Breach'")
-    geo_fence_alerts = cursor.fetchone()[0]
-    
-    # Recent Alerts
+    # Recent Alerts, merged in time order by the alerts index on events
     cursor.execute('''
-        SELECT timestamp, photo_path, status FROM visitors 
-        WHERE status = 'Visitor' 
-        UNION 
-        SELECT timestamp, photo_path, status FROM geo_fence 
-        WHERE status = 'Zone Breach' 
-        ORDER BY timestamp DESC LIMIT 5
+        SELECT ts, photo_path, status FROM events
+        WHERE kind != 'attendance' AND status IN ('Visitor', 'Zone Breach')
+        ORDER BY ts DESC, id DESC LIMIT 5
     ''')
     recent_alerts = [
         {
             'message': f"{row[2]} detected",
-            'date': row[0].split(' ')[0],
-            'time': row[0].split(' ')[1]
+            'date': datetime.fromtimestamp(row[0]).strftime('%Y-%m-%d'),
+            'time': datetime.fromtimestamp(row[0]).strftime('%H:%M:%S')
         }
         for row in cursor.fetchall()
     ]
@@ -332,12 +729,9 @@ def home():
     conn.close()
     
     return render_template('home.html',
-                         total_hostelites=total_hostelites,
-                         today_attendance=today_attendance,
-                         unauthorized_visits=unauthorized_visits,
-                         geo_fence_alerts=geo_fence_alerts,
                          recent_alerts=recent_alerts,
-                         current_datetime=current_datetime)
+                         current_datetime=current_datetime,
+                         **counts)
 
 @app.route('/generate_user_id', methods=['POST'])
 def generate_user_id_route():
@@ -394,7 +788,7 @@ def register():
                     file.save(os.path.join(save_path, f"{i+1}.jpg"))
             else:
                 return jsonify({"status": "error", "message": "Invalid photo method"}), 400
-            conn = sqlite3.connect('hostel.db')
+            conn = db.connect()
             cursor = conn.cursor()
             try:
                 cursor.execute('''
@@ -424,7 +818,7 @@ def register():
 
 @app.route('/train/<user_id>')
 def train(user_id):
-    conn = sqlite3.connect('hostel.db')
+    conn = db.connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT user_id, profile_pic, name, dataset_folder
@@ -444,30 +838,31 @@ def train(user_id):
     return render_template('train.html', user=user)
 
 @app.route('/train_model/<user_id>', methods=['POST'])
+@requires_models
 def train_model(user_id):
     try:
-        conn = sqlite3.connect('hostel.db')
+        conn = db.connect()
         cursor = conn.cursor()
         cursor.execute('SELECT dataset_folder FROM users WHERE user_id = ?', (user_id,))
         row = cursor.fetchone()
+        # Training takes a while; don't keep a pooled connection checked out for it
+        conn.close()
         if not row:
-            conn.close()
             return jsonify({"status": "error", "message": "User not found"}), 404
         dataset_folder = row[0]
         if not os.path.exists(dataset_folder):
-            conn.close()
             return jsonify({"status": "error", "message": "Dataset folder not found"}), 404
         def process_image(img_path):
             try:
                 img = cv2.imread(img_path)
                 img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                faces = detector.detect_faces(img_rgb)
+                faces = models.detector.detect_faces(img_rgb)
                 if not faces or faces[0]['confidence'] < 0.9:
                     return None
                 x, y, w, h = faces[0]['box']
                 face_img = img_rgb[y:y+h, x:x+w]
                 face_img = cv2.resize(face_img, (160, 160))
-                return embedder.embeddings(np.expand_dims(face_img, axis=0))[0]
+                return face_embedder.embeddings(np.expand_dims(face_img, axis=0))[0]
             except Exception as e:
                 logging.debug(f"Error processing {img_path}: {str(e)}")
                 return None
@@ -480,167 +875,127 @@ def train_model(user_id):
                 if result is not None:
                     embeddings.append(result)
         if len(embeddings) < 15:
-            conn.close()
             return jsonify({"status": "error", "message": f"Insufficient valid faces ({len(embeddings)}/15)"}), 400
         avg_embedding = np.mean(embeddings, axis=0)
         avg_embedding = avg_embedding / np.linalg.norm(avg_embedding)
-        embedding_blob = pickle.dumps(avg_embedding)
-        cursor.execute('INSERT INTO embeddings (user_id, embedding) VALUES (?, ?)', (user_id, embedding_blob))
-        conn.commit()
-        EMBEDDINGS_CACHE[user_id] = avg_embedding
-        embedding_file = os.path.join(EMBEDDINGS_DIR, f'{user_id}_embedding.pkl')
-        with open(embedding_file, 'wb') as f:
-            pickle.dump({'embedding': avg_embedding, 'user_id': user_id}, f)
-        logging.debug(f"Saved embedding to: {embedding_file}")
-        conn.close()
+        if GALLERY_MODE == 'templates':
+            embeddings = np.array(embeddings)
+            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+            stored = select_templates(embeddings, MAX_TEMPLATES_PER_USER)
+        else:
+            stored = avg_embedding
+        embedding_store.put(user_id, stored)
+        gallery.attach(*embedding_store.live())
+        if gallery.index is not None:
+            if not gallery.index.is_trained and len(gallery) >= ANN_MIN_USERS:
+                gallery.train_index()
+            # attach() above has already re-assigned this user's cells from the new rows
+            gallery.index.save(ANN_INDEX_PATH)
+        logging.debug(f"Saved embedding for {user_id} to {EMBEDDINGS_STORE_PATH}")
         return jsonify({"status": "success", "message": "Training completed successfully"})
     except Exception as e:
         logging.error(f"Error in train_model: {str(e)}")
-        conn.close()
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/process_attendance', methods=['POST'])
-def process_attendance():
-    try:
-        conn = sqlite3.connect('hostel.db')
-        cursor = conn.cursor()
-        if 'image' not in request.files:
-            conn.close()
-            logging.error("No image provided in request")
-            return jsonify({"status": "error", "message": "No image provided"}), 400
-        img_file = request.files['image']
-        img_data = np.frombuffer(img_file.read(), np.uint8)
-        img = cv2.imdecode(img_data, cv2.IMREAD_COLOR)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)      
-        # Start timing for detection and recognition
-        start_time = time.time()
-        faces = detector.detect_faces(img_rgb)
-        logging.debug(f"Detected {len(faces)} faces")
-        if not faces:
-            conn.close()
-            return jsonify({"status": "error", "message": "No faces detected"}), 400
-        today = datetime.now().strftime('%Y-%m-%d')
-        current_time = datetime.now().strftime('%H:%M:%S')
-        status_messages = []
-        face_imgs = []
-        face_boxes = []
-        for i, face in enumerate(faces):
-            if face['confidence'] < 0.9:
-                logging.debug(f"Face {i+1} skipped due to low confidence: {face['confidence']}")
-                status_messages.append(f"Face {i+1} skipped (low confidence)")
-                continue
-            x, y, w, h = face['box']
-            face_img = img_rgb[y:y+h, x:x+w]
-            face_img = cv2.resize(face_img, (160, 160))
-            face_imgs.append(face_img)
-            face_boxes.append((x, y, w, h))
-        if not face_imgs:
-            conn.close()
-            return jsonify({"status": "error", "message": "No valid faces detected"}), 400
-        face_imgs = np.array(face_imgs)
-        embeddings = embedder.embeddings(face_imgs)
-        # Calculate detection speed
-        detection_speed = time.time() - start_time
-        logging.debug(f"Detection and recognition took {detection_speed:.4f} seconds")
-        debug_img = img.copy()
-        attendance_records = []
-        results = []
-        for i, (embedding, (x, y, w, h)) in enumerate(zip(embeddings, face_boxes)):
-            embedding = embedding / np.linalg.norm(embedding)
-            distances = []
-            for user_id, stored_emb in EMBEDDINGS_CACHE.items():
-                dist = np.linalg.norm(embedding - stored_emb)
-                distances.append((dist, user_id))
-            distances.sort()
-            min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
-
-            # Calculate confidence score
-            confidence = max(0, 100 * (1 - min_dist / threshold)) if min_dist != float('inf') else 0
-            # Adjust confidence for ambiguous matches
-            is_ambiguous = False
-            if len(distances) > 1 and (distances[1][0] - min_dist) < 0.09:
-                is_ambiguous = True
-                confidence = min(confidence, 50)  # Reduce confidence for ambiguous matches
-            if not matched_user_id or min_dist > threshold:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                photo_path = os.path.join(VISITOR_PHOTO_DIR, f"visitor_{timestamp}_face{i+1}.jpg")
-                face_crop = img[y:y+h, x:x+w]
-                cv2.imwrite(photo_path, face_crop)
-
-                #pushover
-                send_pushover_alert(
-                    message=f"An unregistred person detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
-                    image_path=photo_path
-                )
-
-                # Insert visitor with high confidence of not being a hostelite
-                visitor_confidence = 100 - confidence  # High confidence for not being a hostelite
-                cursor.execute('INSERT INTO visitors (timestamp, photo_path, status, confidence, detected_speed) VALUES (?, ?, ?, ?, ?)',
-                              (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), photo_path, 'Visitor', visitor_confidence, detection_speed))
-                logging.debug(f"Visitor photo saved at {photo_path} with confidence {visitor_confidence:.2f}% and detection speed {detection_speed:.4f}s")
-                status_messages.append(f"Visitor detected (face {i+1}, confidence: {visitor_confidence:.2f}%, speed: {detection_speed:.4f}s)")
-                results.append({
+def attendance_policy(ctx):
+    detection_speed = recognition_seconds(ctx)
+    logging.debug(f"Detection and recognition took {detection_speed:.4f} seconds")
+    today = datetime.now().strftime('%Y-%m-%d')
+    current_time = datetime.now().strftime('%H:%M:%S')
+    for i, (distances, (x, y, w, h)) in enumerate(zip(ctx.matches, ctx.boxes)):
+        min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
+
+        # Calculate confidence score
+        confidence = max(0, 100 * (1 - min_dist / threshold)) if min_dist != float('inf') else 0
+        # Adjust confidence for ambiguous matches
+        is_ambiguous = False
+        if len(distances) > 1 and (distances[1][0] - min_dist) < 0.09:
+            is_ambiguous = True
+            confidence = min(confidence, 50)  # Reduce confidence for ambiguous matches
+        if not matched_user_id or min_dist > threshold:
+            face_crop = ctx.img[y:y+h, x:x+w]
+            # Insert visitor with high confidence of not being a hostelite
+            visitor_confidence = 100 - confidence  # High confidence for not being a hostelite
+            event = repeat_event(ctx, 'visitors', face_crop, embedding=ctx.embeddings[i])
+            if event:
+                ctx.messages.append(f"Visitor still present (face {i+1}, seen {event['count']} times)")
+                ctx.results.append({
                     "face": i+1,
                     "status": "Visitor",
                     "user_id": None,
                     "confidence": round(visitor_confidence, 2),
+                    "detected_speed": round(detection_speed, 4),
+                    "seen_count": event['count']
+                })
+                continue
+            new_event(ctx, 'visitors', 'visitor', i+1, face_crop,
+                      f"An unregistred person detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
+                      {'status': 'Visitor', 'confidence': visitor_confidence, 'detected_speed': detection_speed},
+                      embedding=ctx.embeddings[i])
+            ctx.messages.append(f"Visitor detected (face {i+1}, confidence: {visitor_confidence:.2f}%, speed: {detection_speed:.4f}s)")
+            ctx.results.append({
+                "face": i+1,
+                "status": "Visitor",
+                "user_id": None,
+                "confidence": round(visitor_confidence, 2),
+                "detected_speed": round(detection_speed, 4)
+            })
+        else:
+            if is_ambiguous:
+                logging.warning(f"Face {i+1} ambiguous: {matched_user_id} ({min_dist}) vs {distances[1][1]} ({distances[1][0]})")
+                ctx.messages.append(f"Ambiguous face detected (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
+                ctx.results.append({
+                    "face": i+1,
+                    "status": "Ambiguous",
+                    "user_id": matched_user_id,
+                    "confidence": round(confidence, 2),
+                    "detected_speed": round(detection_speed, 4)
+                })
+                continue
+            if not daily_presence.claim(matched_user_id, today):
+                ctx.messages.append(f"Attendance already marked for {matched_user_id} (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
+                ctx.results.append({
+                    "face": i+1,
+                    "status": "Already Marked",
+                    "user_id": matched_user_id,
+                    "confidence": round(confidence, 2),
                     "detected_speed": round(detection_speed, 4)
                 })
-                cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                cv2.putText(debug_img, f"Visitor ({visitor_confidence:.2f}%, {detection_speed:.4f}s)", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
             else:
-                if is_ambiguous:
-                    logging.warning(f"Face {i+1} ambiguous: {matched_user_id} ({min_dist}) vs {distances[1][1]} ({distances[1][0]})")
-                    status_messages.append(f"Ambiguous face detected (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
-                    results.append({
-                        "face": i+1,
-                        "status": "Ambiguous",
-                        "user_id": matched_user_id,
-                        "confidence": round(confidence, 2),
-                        "detected_speed": round(detection_speed, 4)
-                    })
-                    cv2.rectangle(debug_img, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                    cv2.putText(debug_img, f"Ambiguous ({confidence:.2f}%, {detection_speed:.4f}s)", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-                    continue
-                cursor.execute('SELECT id FROM attendance WHERE user_id = ? AND date = ?', (matched_user_id, today))
-                if cursor.fetchone():
-                    status_messages.append(f"Attendance already marked for {matched_user_id} (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
-                    results.append({
-                        "face": i+1,
-                        "status": "Already Marked",
-                        "user_id": matched_user_id,
-                        "confidence": round(confidence, 2),
-                        "detected_speed": round(detection_speed, 4)
-                    })
-                else:
-                    attendance_records.append((matched_user_id, today, current_time, 'Present', confidence, detection_speed))
-                    status_messages.append(f"Attendance marked for {matched_user_id} (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
-                    results.append({
-                        "face": i+1,
-                        "status": "Present",
-                        "user_id": matched_user_id,
-                        "confidence": round(confidence, 2),
-                        "detected_speed": round(detection_speed, 4)
-                    })
-                cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(debug_img, f"{matched_user_id} ({confidence:.2f}%, {detection_speed:.4f}s)", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        if attendance_records:
-            cursor.executemany('INSERT INTO attendance (user_id, date, time, status, confidence, detected_speed) VALUES (?, ?, ?, ?, ?, ?)', attendance_records)
-        conn.commit()
-        conn.close()
-        return jsonify({
-            "status": "success",
-            "message": "; ".join(status_messages),
-            "results": results
-        })
-    except Exception as e:
-        logging.error(f"Error in process_attendance: {str(e)}")
-        conn.close()
-        return jsonify({"status": "error", "message": str(e)}), 500
+                ctx.writes.append({'op': 'attendance', 'row': (matched_user_id, today, current_time, 'Present', confidence, detection_speed)})
+                ctx.messages.append(f"Attendance marked for {matched_user_id} (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
+                ctx.results.append({
+                    "face": i+1,
+                    "status": "Present",
+                    "user_id": matched_user_id,
+                    "confidence": round(confidence, 2),
+                    "detected_speed": round(detection_speed, 4)
+                })
+
+attendance_pipeline = Pipeline('attendance', dict(RECOGNITION_STAGES, policy=attendance_policy), lambda ctx: {
+    "status": "success",
+    "message": "; ".join(ctx.messages),
+    "results": ctx.results,
+    "embeddings_skipped": ctx.skipped
+})
+
+def attendance_frame(frame, camera_id='default', detector=None):
+    """Mark attendance for one JPEG frame; returns (response payload, HTTP status)."""
+    return attendance_pipeline.run(FrameContext('attendance', frame, camera_id, detector=detector))
+
+@app.route('/process_attendance', methods=['POST'])
+@requires_models
+def process_attendance():
+    if 'image' not in request.files:
+        logging.error("No image provided in request")
+        return jsonify({"status": "error", "message": "No image provided"}), 400
+    payload, code = attendance_frame(request.files['image'].read(), request.form.get('camera_id', 'default'))
+    return jsonify(payload), code
 
 @app.route('/attendance')
+@versioned_view('attendance', 'users', daily=True)
 def attendance():
-    conn = sqlite3.connect('hostel.db')
+    conn = db.connect()
     cursor = conn.cursor()
     today = datetime.now().strftime('%Y-%m-%d')
     cursor.execute('''
@@ -668,8 +1023,9 @@ def attendance():
     return render_template('attendance.html', present_list=present_list, absent_list=absent_list)
 
 @app.route('/info')
+@versioned_view('users')
 def info():
-    conn = sqlite3.connect('hostel.db')
+    conn = db.connect()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT user_id, profile_pic, name, age, contact, email, created_at, role
@@ -690,129 +1046,57 @@ def info():
 
 @app.route('/intrusion-monitor')
 def intrusion_monitor():
-    conn = sqlite3.connect('hostel.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT timestamp, photo_path, status, confidence, detected_speed FROM visitors ORDER BY timestamp DESC')
-    unauthorized_entries = [
-        {
-            'image_url': row[1],
-            'date': row[0].split(' ')[0],
-            'time': row[0].split(' ')[1],
-            'status': row[2],
-            'confidence': row[3],
-            'detected_speed': row[4]
-        }
-        for row in cursor.fetchall()
-    ]
-    conn.close()
-    return render_template('intrusion-monitor.html', unauthorized_entries=unauthorized_entries)
-    
-@app.route('/process_intrusion', methods=['POST'])
-def process_intrusion():
-    try:
-        conn = sqlite3.connect('hostel.db')
-        cursor = conn.cursor()
-        if 'image' not in request.files:
-            conn.close()
-            logging.error("No image provided in request")
-            return jsonify({"status": "error", "message": "No image provided"}), 400
-        img_file = request.files['image']
-        img_data = np.frombuffer(img_file.read(), np.uint8)
-        img = cv2.imdecode(img_data, cv2.IMREAD_COLOR)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
-        start_time = time.time()
-        faces = detector.detect_faces(img_rgb)
-        logging.debug(f"Detected {len(faces)} faces")
-        if not faces:
-            conn.close()
-            return jsonify({"status": "error", "message": "No faces detected"}), 400
-
-        status_messages = []
-        face_imgs = []
-        face_boxes = []
-        for i, face in enumerate(faces):
-            if face['confidence'] < 0.9:
-                logging.debug(f"Face {i+1} skipped due to low confidence: {face['confidence']}")
-                status_messages.append(f"Face {i+1} skipped (low confidence)")
+    # Rows are loaded by the page from /events/visitors
+    return render_template('intrusion-monitor.html')
+
+def intrusion_policy(ctx):
+    detection_speed = recognition_seconds(ctx)
+    logging.debug(f"Detection and recognition took {detection_speed:.4f} seconds")
+    for i, (distances, (x, y, w, h)) in enumerate(zip(ctx.matches, ctx.boxes)):
+        min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
+        confidence = max(0, 100 * (1 - min_dist / threshold)) if min_dist != float('inf') else 0
+        if not matched_user_id or min_dist > threshold:
+            face_crop = ctx.img[y:y+h, x:x+w]
+            event = repeat_event(ctx, 'visitors', face_crop, embedding=ctx.embeddings[i])
+            if event:
+                ctx.messages.append(f"Visitor still present (face {i+1}, seen {event['count']} times)")
                 continue
-            x, y, w, h = face['box']
-            face_img = img_rgb[y:y+h, x:x+w]
-            face_img = cv2.resize(face_img, (160, 160))
-            face_imgs.append(face_img)
-            face_boxes.append((x, y, w, h))
-
-        if not face_imgs:
-            conn.close()
-            return jsonify({"status": "error", "message": "No valid faces detected"}), 400
+            visitor_confidence = 100 - confidence
+            new_event(ctx, 'visitors', 'visitor', i+1, face_crop,
+                      f"🚨 Visitor Detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
+                      {'status': 'Visitor', 'confidence': visitor_confidence, 'detected_speed': detection_speed},
+                      embedding=ctx.embeddings[i])
+            ctx.messages.append(f"Visitor detected (face {i+1}, confidence: {visitor_confidence:.2f}%, speed: {detection_speed:.4f}s)")
+        else:
+            if len(distances) > 1 and (distances[1][0] - min_dist) < 0.09:
+                logging.warning(f"Face {i+1} ambiguous: {matched_user_id} ({min_dist}) vs {distances[1][1]} ({distances[1][0]})")
+                ctx.messages.append(f"Ambiguous face detected (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
+            else:
+                ctx.messages.append(f"Authorized user detected: {matched_user_id} (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
 
-        face_imgs = np.array(face_imgs)
-        embeddings = embedder.embeddings(face_imgs)
-        detection_speed = time.time() - start_time
-        logging.debug(f"Detection and recognition took {detection_speed:.4f} seconds")
+intrusion_pipeline = Pipeline('intrusion', dict(RECOGNITION_STAGES, policy=intrusion_policy), lambda ctx: {
+    "status": "success",
+    "message": "; ".join(ctx.messages),
+    "embeddings_skipped": ctx.skipped
+})
 
-        debug_img = img.copy()  # no rectangle or label will be drawn on this image
+def intrusion_frame(frame, camera_id='default', detector=None):
+    """Check one JPEG frame for visitors; returns (response payload, HTTP status)."""
+    return intrusion_pipeline.run(FrameContext('intrusion', frame, camera_id, detector=detector))
 
-        for i, (embedding, (x, y, w, h)) in enumerate(zip(embeddings, face_boxes)):
-            embedding = embedding / np.linalg.norm(embedding)
-            distances = []
-            for user_id, stored_emb in EMBEDDINGS_CACHE.items():
-                dist = np.linalg.norm(embedding - stored_emb)
-                distances.append((dist, user_id))
-            distances.sort()
-            min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
-            confidence = max(0, 100 * (1 - min_dist / threshold)) if min_dist != float('inf') else 0
-            if not matched_user_id or min_dist > threshold:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                photo_path = os.path.join(VISITOR_PHOTO_DIR, f"visitor_{timestamp}_face{i+1}.jpg")
-                face_crop = img[y:y+h, x:x+w]
-                cv2.imwrite(photo_path, face_crop)
-
-                #pushover
-                send_pushover_alert(
-                    message=f"🚨 Visitor Detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
-                    image_path=photo_path
-                )
-
-                visitor_confidence = 100 - confidence
-                cursor.execute('INSERT INTO visitors (timestamp, photo_path, status, confidence, detected_speed) VALUES (?, ?, ?, ?, ?)',
-                              (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), photo_path, 'Visitor', visitor_confidence, detection_speed))
-                logging.debug(f"Visitor photo saved at {photo_path} with confidence {visitor_confidence:.2f}% and detection speed {detection_speed:.4f}s")
-                status_messages.append(f"Visitor detected (face {i+1}, confidence: {visitor_confidence:.2f}%, speed: {detection_speed:.4f}s)")
-            else:
-                if len(distances) > 1 and (distances[1][0] - min_dist) < 0.09:
-                    logging.warning(f"Face {i+1} ambiguous: {matched_user_id} ({min_dist}) vs {distances[1][1]} ({distances[1][0]})")
-                    status_messages.append(f"Ambiguous face detected (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
-                else:
-                    status_messages.append(f"Authorized user detected: {matched_user_id} (face {i+1}, confidence: {confidence:.2f}%, speed: {detection_speed:.4f}s)")
-        conn.commit()
-        conn.close()
-        return jsonify({
-            "status": "success",
-            "message": "; ".join(status_messages)
-        })
-    except Exception as e:
-        logging.error(f"Error in process_intrusion: {str(e)}")
-        conn.close()
-        return jsonify({"status": "error", "message": str(e)}), 500
+@app.route('/process_intrusion', methods=['POST'])
+@requires_models
+def process_intrusion():
+    if 'image' not in request.files:
+        logging.error("No image provided in request")
+        return jsonify({"status": "error", "message": "No image provided"}), 400
+    payload, code = intrusion_frame(request.files['image'].read(), request.form.get('camera_id', 'default'))
+    return jsonify(payload), code
 
 @app.route('/geo-fence-monitor')
 def geo_fence_monitor():
-    conn = sqlite3.connect('hostel.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT timestamp, photo_path, status,user_id FROM geo_fence WHERE status = "Zone Breach" ORDER BY timestamp DESC')
-    geo_fence_breaches = [
-        {
-            'image_url': row[1],
-            'date': row[0].split(' ')[0],
-            'time': row[0].split(' ')[1],
-            'status': row[2],
-            'user_id':row[3]
-        }
-        for row in cursor.fetchall()
-    ]
-    conn.close()
-    return render_template('geo-fence-monitor.html', geo_fence_breaches=geo_fence_breaches)
+    # Rows are loaded by the page from /events/breaches
+    return render_template('geo-fence-monitor.html')
 
 @app.route('/save_geo_fence_boundary', methods=['POST'])
 def save_geo_fence_boundary():
@@ -857,165 +1141,254 @@ def is_point_in_polygon(x, y, points):
 def is_box_in_polygon(x, y, w, h, polygon):
     return any(is_point_in_polygon(px, py, polygon) for px, py in [(x, y), (x+w, y), (x+w, y+h), (x, y+h)])
 
-@app.route('/process_geo_fence', methods=['POST'])
-def process_geo_fence():
-    try:
-        logging.debug("Starting process_geo_fence")
-        if 'image' not in request.files:
-            logging.error("No image provided in request")
-            return jsonify({"status": "error", "message": "No image provided"}), 400
-
+def load_zone(boundary=None):
+    """Return the zone polygon as integer points, from the camera's own zone or the saved boundary."""
+    if boundary is None:
         boundary_file = os.path.join('static', 'geo_fence_boundary.pkl')
         if not os.path.exists(boundary_file):
             logging.error("Geo-fence boundary file not found")
-            return jsonify({"status": "error", "message": "Geo-fence boundary not set"}), 400
-        
+            raise StopFrame({"status": "error", "message": "Geo-fence boundary not set"}, 400)
+
         try:
             with open(boundary_file, 'rb') as f:
                 boundary = pickle.load(f)
         except Exception as e:
             logging.error(f"Error loading boundary file: {str(e)}")
-            return jsonify({"status": "error", "message": f"Error loading boundary: {str(e)}"}), 500
-        
-        if not boundary or len(boundary) < 3:
-            logging.error(f"Invalid boundary: {boundary}")
-            return jsonify({"status": "error", "message": "Invalid geo-fence boundary: Minimum 3 points required"}), 400
-
-        img_file = request.files['image']
-        img_data = np.frombuffer(img_file.read(), np.uint8)
-        logging.debug("Decoding image")
-        img = cv2.imdecode(img_data, cv2.IMREAD_COLOR)
-        if img is None:
-            logging.error("Failed to decode image")
-            return jsonify({"status": "error", "message": "Failed to decode image"}), 400
-        
-        logging.debug("Converting image to RGB")
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        logging.debug("Detecting faces")
-        faces = detector.detect_faces(img_rgb)
-        faces = [f for f in faces if f['confidence'] >= 0.9]
-        logging.debug(f"Detected {len(faces)} faces with confidence >= 0.9")
-        
-        if not faces:
-            logging.debug("No faces detected, returning early")
-            return jsonify({"status": "success", "message": "No faces detected", "debug_image": None})
-
-        conn = sqlite3.connect('hostel.db')
-        cursor = conn.cursor()
-        status_messages = []
-        debug_img = img.copy()
-        
-        # Convert boundary points to integer tuples
-        try:
-            boundary_points = [(int(p['x']), int(p['y'])) for p in boundary]
-            logging.debug(f"Converted boundary points: {boundary_points}")
-        except (KeyError, TypeError, ValueError) as e:
-            logging.error(f"Invalid boundary point format: {boundary}, error: {str(e)}")
-            conn.close()
-            return jsonify({"status": "error", "message": f"Invalid boundary point format: {str(e)}"}), 400
+            raise StopFrame({"status": "error", "message": f"Error loading boundary: {str(e)}"}, 500)
 
-        # Draw boundary on debug image
-        for j in range(len(boundary_points)):
-            pt1, pt2 = boundary_points[j], boundary_points[(j+1)%len(boundary_points)]
-            logging.debug(f"Drawing line from {pt1} to {pt2}")
-            cv2.line(debug_img, pt1, pt2, (255,255,0), 2)
+    if not boundary or len(boundary) < 3:
+        logging.error(f"Invalid boundary: {boundary}")
+        raise StopFrame({"status": "error", "message": "Invalid geo-fence boundary: Minimum 3 points required"}, 400)
 
-        face_imgs = []
-        face_boxes = []
-        for i, face in enumerate(faces):
-            x, y, w, h = face['box']
-            logging.debug(f"Checking face {i+1} at box ({x}, {y}, {w}, {h})")
-            if not is_box_in_polygon(x, y, w, h, boundary_points):
-                logging.debug(f"Face {i+1} outside boundary, skipping")
+    try:
+        return [(int(p['x']), int(p['y'])) for p in boundary]
+    except (KeyError, TypeError, ValueError) as e:
+        logging.error(f"Invalid boundary point format: {boundary}, error: {str(e)}")
+        raise StopFrame({"status": "error", "message": f"Invalid boundary point format: {str(e)}"}, 400)
+
+def geo_fence_decode_stage(ctx):
+    # Without a usable zone there is nothing to check, so fail before any image work
+    ctx.boundary_points = load_zone(ctx.options.get('boundary'))
+    decode_stage(ctx)
+
+def zone_filter_stage(ctx):
+    faces = [f for f in ctx.faces if f['confidence'] >= 0.9]
+    logging.debug(f"Detected {len(faces)} faces with confidence >= 0.9")
+    if not faces:
+        raise StopFrame({"status": "success", "message": "No faces detected", "debug_image": None})
+    for i, face in enumerate(faces):
+        x, y, w, h = face['box']
+        if not is_box_in_polygon(x, y, w, h, ctx.boundary_points):
+            logging.debug(f"Face {i+1} outside boundary, skipping")
+            continue
+        ctx.boxes.append((x, y, w, h))
+    if not ctx.boxes:
+        raise StopFrame({"status": "success", "message": "No faces detected in boundary", "debug_image": None})
+
+def geo_fence_policy(ctx):
+    cursor = db_cursor(ctx)
+    for i, (distances, (x, y, w, h)) in enumerate(zip(ctx.matches, ctx.boxes)):
+        min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
+        logging.debug(f"Face {i+1}: min_dist={min_dist}, matched_user_id={matched_user_id}")
+
+        if not matched_user_id or min_dist > threshold:
+            face_crop = ctx.img[y:y+h, x:x+w]
+            event = repeat_event(ctx, 'geo_fence', face_crop, embedding=ctx.embeddings[i])
+            if event:
+                ctx.messages.append(f"Unauthorized breach ongoing (face {i+1}, seen {event['count']} times)")
                 continue
-            face_img = img_rgb[y:y+h, x:x+w]
-            face_img = cv2.resize(face_img, (160, 160))
-            face_imgs.append(face_img)
-            face_boxes.append((x, y, w, h))
-
-        if not face_imgs:
-            conn.close()
-            logging.debug("No faces detected in boundary, returning early")
-            return jsonify({"status": "success", "message": "No faces detected in boundary", "debug_image": None})
-
-        logging.debug(f"Processing {len(face_imgs)} faces")
-        face_imgs = np.array(face_imgs)
-        embeddings = embedder.embeddings(face_imgs)
+            new_event(ctx, 'geo_fence', 'breach', i+1, face_crop,
+                      f"An Unknown Zone Breach Detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
+                      {'status': 'Zone Breach'}, embedding=ctx.embeddings[i])
+            ctx.messages.append(f"Unauthorized breach detected (face {i+1})")
+        else:
+            cursor.execute('SELECT role FROM users WHERE user_id = ?', (matched_user_id,))
+            result = cursor.fetchone()
+            if not result:
+                continue
+            role = result[0]
+            logging.debug(f"Face {i+1}: matched role={role}")
+            if role in ['warden', 'support_staff']:
+                ctx.messages.append(f"Authorized {role} {matched_user_id} in zone")
+                continue
+            face_crop = ctx.img[y:y+h, x:x+w]
+            event = repeat_event(ctx, 'geo_fence', face_crop, user_id=matched_user_id)
+            if event:
+                ctx.messages.append(f"Hostelite breach ongoing: {matched_user_id} (face {i+1}, seen {event['count']} times)")
+                continue
+            new_event(ctx, 'geo_fence', 'breach', i+1, face_crop,
+                      f" Zone Breach Detected for {matched_user_id} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
+                      {'status': 'Zone Breach', 'user_id': matched_user_id}, user_id=matched_user_id)
+            ctx.messages.append(f"Hostelite breach: {matched_user_id} (face {i+1})")
+
+geo_fence_pipeline = Pipeline('geo_fence', dict(RECOGNITION_STAGES, decode=geo_fence_decode_stage,
+                                                filter=zone_filter_stage, policy=geo_fence_policy), lambda ctx: {
+    "status": "success",
+    "message": "; ".join(ctx.messages) if ctx.messages else "No unauthorized breaches detected",
+    "embeddings_skipped": ctx.skipped
+})
+
+def geo_fence_frame(frame, camera_id='default', boundary=None, detector=None):
+    """Check one JPEG frame for geo-fence breaches; returns (response payload, HTTP status).
+
+    Cameras with their own zone pass it as boundary; otherwise the saved boundary is used.
+    """
+    return geo_fence_pipeline.run(FrameContext('geo_fence', frame, camera_id, boundary=boundary, detector=detector))
+    
+@app.route('/process_geo_fence', methods=['POST'])
+@requires_models
+def process_geo_fence():
+    if 'image' not in request.files:
+        logging.error("No image provided in request")
+        return jsonify({"status": "error", "message": "No image provided"}), 400
+    payload, code = geo_fence_frame(request.files['image'].read(), request.form.get('camera_id', 'default'))
+    return jsonify(payload), code
+
+FRAME_HANDLERS = {
+    'attendance': attendance_frame,
+    'intrusion': intrusion_frame,
+    'geo_fence': geo_fence_frame,
+}
+
+# Long-lived per-camera WebSocket carrying length-prefixed JPEG frames; only the newest
+# frame waiting for inference is kept, so clients can send faster than the models run
+STREAM_MAX_FRAME_BYTES = 4 * 1024 * 1024
+stream_hub = StreamHub(max_frame_bytes=STREAM_MAX_FRAME_BYTES)
+sock = Sock(app) if Sock is not None else None
+
+def stream_frames(ws, mode):
+    handler = FRAME_HANDLERS.get(mode)
+    if handler is None:
+        ws.send(json.dumps({"status": "error", "message": f"Unknown stream mode: {mode}"}))
+        return
+    camera_id = request.args.get('camera_id', 'default')
+    session = stream_hub.open(
+        (mode, camera_id),
+        lambda frame: handler(frame, camera_id),
+        ws.send,
+        ready=lambda: models.ready,
+        not_ready_payload={"status": "warming_up", "message": "Recognition models are warming up, please retry shortly"},
+    )
+    logging.debug(f"Stream opened for {mode} camera {camera_id}")
+    try:
+        while True:
+            data = ws.receive()
+            if data is None:
+                break
+            if isinstance(data, str):
+                continue  # keep-alive
+            session.feed(data)
+    except FrameTooLarge as e:
+        logging.error(f"Closing {mode} stream for camera {camera_id}: {str(e)}")
+        ws.send(json.dumps({"status": "error", "message": str(e)}))
+    finally:
+        stream_hub.close(session)
+        logging.debug(f"Stream closed for {mode} camera {camera_id}")
+
+if sock is not None:
+    sock.route('/stream/<mode>')(stream_frames)
+
+# CCTV feeds configured in the cameras table are sampled by server-side worker threads
+app.config['CAPTURE_WORKERS'] = True
+
+def capture_handler(camera):
+    handler = FRAME_HANDLERS.get(camera['mode'])
+    if handler is None:
+        return None
+    options = {'detector': camera['detector']}
+    if camera['mode'] == 'geo_fence' and camera['zone']:
+        options['boundary'] = camera['zone']
+    return lambda frame: handler(frame, camera['camera_id'], **options)
+
+capture_manager = CaptureManager(capture_handler, ready=lambda: models.ready)
+
+def load_cameras():
+    conn = db.connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('SELECT camera_id, source, mode, zone, fps, detector, enabled FROM cameras ORDER BY id').fetchall()
+    conn.close()
+    return [dict(row, zone=json.loads(row['zone']) if row['zone'] else None) for row in rows]
+
+def sync_capture_workers():
+    if app.config['CAPTURE_WORKERS']:
+        capture_manager.sync(load_cameras())
+
+_capture_started = False
+
+@app.before_request
+def start_capture_workers():
+    global _capture_started
+    if not _capture_started:
+        _capture_started = True
+        sync_capture_workers()
+
+def valid_zone(zone):
+    # A polygon of at least 3 points, each {"x": number, "y": number} as the geo-fence editor sends them
+    def number(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return (isinstance(zone, list) and len(zone) >= 3 and
+            all(isinstance(p, dict) and number(p.get('x')) and number(p.get('y')) for p in zone))
+
+@app.route('/cameras', methods=['GET', 'POST'])
+def cameras():
+    if request.method == 'GET':
+        stats = capture_manager.metrics()
+        return jsonify({"status": "success", "cameras": [
+            dict(camera, stats=stats.get(camera['camera_id'])) for camera in load_cameras()
+        ]})
+    data = request.get_json(silent=True) or {}
+    camera_id = data.get('camera_id')
+    source = data.get('source')
+    mode = data.get('mode')
+    if not camera_id or not source:
+        return jsonify({"status": "error", "message": "camera_id and source are required"}), 400
+    if mode not in FRAME_HANDLERS:
+        return jsonify({"status": "error", "message": f"mode must be one of {', '.join(FRAME_HANDLERS)}"}), 400
+    zone = data.get('zone')
+    if zone is not None and not valid_zone(zone):
+        return jsonify({"status": "error", "message": "Invalid zone: a list of at least 3 {x, y} points is required"}), 400
+    try:
+        fps = float(data.get('fps', 1))
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "fps must be a number"}), 400
+    if fps <= 0:
+        return jsonify({"status": "error", "message": "fps must be positive"}), 400
+    detector = data.get('detector')
+    if detector is not None and detector not in face_detectors.names():
+        return jsonify({"status": "error", "message": f"detector must be one of {', '.join(face_detectors.names())}"}), 400
+    conn = db.connect()
+    conn.execute('''
+        INSERT INTO cameras (camera_id, source, mode, zone, fps, detector, enabled) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(camera_id) DO UPDATE SET
+            source = excluded.source, mode = excluded.mode, zone = excluded.zone,
+            fps = excluded.fps, detector = excluded.detector, enabled = excluded.enabled
+    ''', (camera_id, source, mode, json.dumps(zone) if zone else None, fps, detector, int(bool(data.get('enabled', True)))))
+    conn.commit()
+    conn.close()
+    sync_capture_workers()
+    return jsonify({"status": "success", "message": f"Camera {camera_id} saved"})
 
-        for i, (embedding, (x, y, w, h)) in enumerate(zip(embeddings, face_boxes)):
-            embedding = embedding / np.linalg.norm(embedding)
-            distances = [(np.linalg.norm(embedding - emb), uid) for uid, emb in EMBEDDINGS_CACHE.items()]
-            distances.sort()
-            min_dist, matched_user_id = distances[0] if distances else (float('inf'), None)
-            logging.debug(f"Face {i+1}: min_dist={min_dist}, matched_user_id={matched_user_id}")
-
-            if not matched_user_id or min_dist > threshold:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                photo_path = os.path.join(VISITOR_PHOTO_DIR, f"breach_{timestamp}_face{i+1}.jpg")
-                logging.debug(f"Saving unauthorized face at {photo_path}")
-                cv2.imwrite(photo_path, img[y:y+h, x:x+w])
-
-                #pushover
-                send_pushover_alert(
-                    message=f"An Unknown Zone Breach Detected at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
-                    image_path=photo_path
-                )
-
-                cursor.execute('INSERT INTO geo_fence (timestamp, photo_path, status) VALUES (?, ?, ?)',
-                               (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), photo_path, 'Zone Breach'))
-                status_messages.append(f"Unauthorized breach detected (face {i+1})")
-                cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                cv2.putText(debug_img, "Unauthorized", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            else:
-                cursor.execute('SELECT role FROM users WHERE user_id = ?', (matched_user_id,))
-                result = cursor.fetchone()
-                if result:
-                    role = result[0]
-                    logging.debug(f"Face {i+1}: matched role={role}")
-                    if role in ['warden', 'support_staff']:
-                        status_messages.append(f"Authorized {role} {matched_user_id} in zone")
-                        cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                        cv2.putText(debug_img, matched_user_id, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    else:
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                        photo_path = os.path.join(VISITOR_PHOTO_DIR, f"breach_{timestamp}_face{i+1}.jpg")
-                        logging.debug(f"Saving hostelite breach at {photo_path}")
-                        cv2.imwrite(photo_path, img[y:y+h, x:x+w])
-
-                        #pushover
-                        send_pushover_alert(
-                            message=f" Zone Breach Detected for {matched_user_id} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}!",
-                            image_path=photo_path
-                        )
-
-                        cursor.execute('INSERT INTO geo_fence (timestamp, photo_path, status,user_id) VALUES (?, ?, ?,?)',
-                                       (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), photo_path, 'Zone Breach',matched_user_id))
-                        status_messages.append(f"Hostelite breach: {matched_user_id} (face {i+1})")
-                        cv2.rectangle(debug_img, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                        cv2.putText(debug_img, matched_user_id, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-        conn.commit()
-        conn.close()
-        return jsonify({
-            "status": "success",
-            "message": "; ".join(status_messages) if status_messages else "No unauthorized breaches detected",
-        })
+@app.route('/cameras/<camera_id>', methods=['DELETE'])
+def delete_camera(camera_id):
+    conn = db.connect()
+    deleted = conn.execute('DELETE FROM cameras WHERE camera_id = ?', (camera_id,)).rowcount
+    conn.commit()
+    conn.close()
+    if not deleted:
+        return jsonify({"status": "error", "message": f"Camera {camera_id} not found"}), 404
+    sync_capture_workers()
+    return jsonify({"status": "success", "message": f"Camera {camera_id} removed"})
 
-    except Exception as e:
-        if 'conn' in locals():
-            conn.close()
-        error_message = f"Geo-fence processing error: {str(e)}\n{traceback.format_exc()}"
-        logging.error(error_message)
-        return jsonify({"status": "error", "message": error_message}), 500
-    
 @app.route('/clear_notifications', methods=['POST'])
 def clear_notifications():
     try:
-        conn = sqlite3.connect('hostel.db')
+        conn = db.connect()
         cursor = conn.cursor()
         # Delete all records from both tables
         cursor.execute('DELETE FROM visitors')
         cursor.execute('DELETE FROM geo_fence')
         conn.commit()
+        event_broker.publish('stats', dashboard_counts(conn))
         conn.close()
         flash('All notifications cleared successfully!', 'success')
     except Exception as e:
@@ -1025,18 +1398,17 @@ def clear_notifications():
 
 
 def get_db_connection():
-    conn = sqlite3.connect('hostel.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db.connect(row_factory=sqlite3.Row)
 
 # Replace the existing insights route with this updated version
 @app.route('/insights')
+@versioned_view('attendance', 'visitors', 'geo_fence', 'users', daily=True)
 def insights():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Fetch distinct dates for attendance
-    cursor.execute("SELECT DISTINCT date FROM attendance ORDER BY date DESC")
+    # Dashboard figures come from the summary tables kept by triggers (see migrations.py)
+    cursor.execute("SELECT date FROM daily_stats WHERE present > 0 ORDER BY date DESC")
     dates = [row['date'] for row in cursor.fetchall()]
     
     # Fetch hostelites (users with role 'hostelite')
@@ -1044,86 +1416,33 @@ def insights():
     hostelites = [{'user_id': row['user_id'], 'name': row['name']} for row in cursor.fetchall()]
     
     # Fetch zone breach counts per user
-    cursor.execute("SELECT user_id, COUNT(*) as breach_count FROM geo_fence WHERE status = 'Zone Breach' AND user_id IS NOT NULL GROUP BY user_id")
-    zone_breaches = {row['user_id']: row['breach_count'] for row in cursor.fetchall()}
+    cursor.execute("SELECT user_id, breaches FROM user_breaches WHERE breaches > 0")
+    zone_breaches = {row['user_id']: row['breaches'] for row in cursor.fetchall()}
     
     # Fetch 30-day attendance data
-    today = datetime.now().strftime('%Y-%m-%d')
     one_month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
     cursor.execute("""
-        SELECT date, COUNT(*) as present_count 
-        FROM attendance 
-        WHERE status = 'Present' AND date >= ? 
-        GROUP BY date 
+        SELECT date, present FROM daily_stats
+        WHERE date >= ? AND present > 0
         ORDER BY date
     """, (one_month_ago,))
-    attendance_data = [{'date': row['date'], 'present_count': row['present_count']} for row in cursor.fetchall()]
+    attendance_data = [{'date': row['date'], 'present_count': row['present']} for row in cursor.fetchall()]
     
     # Fetch monthly comparison (last two months)
-    last_month_start = (datetime.now() - timedelta(days=60)).strftime('%Y-%m-%d')
+    last_month_start = (datetime.now() - timedelta(days=60)).strftime('%Y-%m')
     cursor.execute("""
-        SELECT strftime('%Y-%m', date) as month, COUNT(*) as present_count 
-        FROM attendance 
-        WHERE status = 'Present' AND date >= ? 
-        GROUP BY month 
+        SELECT month, present FROM monthly_stats
+        WHERE month >= ? AND present > 0
         ORDER BY month DESC
         LIMIT 2
     """, (last_month_start,))
-    monthly_comparison = [{'month': row['month'], 'present_count': row['present_count']} for row in cursor.fetchall()]
-    
-    # Fetch calendar data
-    cursor.execute("""
-        SELECT date, COUNT(*) as present_count
-        FROM attendance 
-        WHERE status = 'Present'
-        GROUP BY date
-    """)
-    calendar_data = [{'date': row['date'], 'present_count': row['present_count']} for row in cursor.fetchall()]
-    
-    # Fetch geo-fence breaches
-    cursor.execute("SELECT timestamp, photo_path, status, user_id FROM geo_fence WHERE status = 'Zone Breach' ORDER BY timestamp DESC")
-    geo_fence_breaches = [
-        {
-            'image_url': row['photo_path'],
-            'date': row['timestamp'].split(' ')[0] if ' ' in row['timestamp'] else row['timestamp'],
-            'time': row['timestamp'].split(' ')[1] if ' ' in row['timestamp'] else '00:00:00',
-            'status': row['status'],
-            'user_id': row['user_id']
-        }
-        for row in cursor.fetchall()
-    ]
+    monthly_comparison = [{'month': row['month'], 'present_count': row['present']} for row in cursor.fetchall()]
     
-    # Fetch notifications (visitors and geo-fence breaches)
-    cursor.execute("SELECT timestamp, photo_path, status FROM visitors ORDER BY timestamp DESC")
-    visitor_alerts = [
-        {
-            'type': row['status'],
-            'hostelite_id': None,
-            'name': None,
-            'time': row['timestamp'].split(' ')[1] if ' ' in row['timestamp'] else row['timestamp'],
-            'date': row['timestamp'].split(' ')[0] if ' ' in row['timestamp'] else datetime.now().strftime('%Y-%m-%d'),
-            'message': f"Visitor detected",
-            'photo': row['photo_path']
-        }
-        for row in cursor.fetchall()
-    ]
-    
-    cursor.execute("SELECT timestamp, photo_path, status, user_id FROM geo_fence ORDER BY timestamp DESC")
-    geo_fence_alerts = [
-        {
-            'type': row['status'],
-            'hostelite_id': row['user_id'],
-            'name': None,
-            'time': row['timestamp'].split(' ')[1] if ' ' in row['timestamp'] else row['timestamp'],
-            'date': row['timestamp'].split(' ')[0] if ' ' in row['timestamp'] else datetime.now().strftime('%Y-%m-%d'),
-            'message': f"Zone breach detected",
-            'photo': row['photo_path']
-        }
-        for row in cursor.fetchall()
-    ]
-    
-    notifications = visitor_alerts + geo_fence_alerts
-    notifications.sort(key=lambda x: x['date'] + ' ' + x['time'], reverse=True)
+    # Fetch calendar data, and the visitor and breach counts shown for a selected date
+    cursor.execute("SELECT date, present, visitors, breaches FROM daily_stats")
+    daily_rows = cursor.fetchall()
+    calendar_data = [{'date': row['date'], 'present_count': row['present']} for row in daily_rows if row['present'] > 0]
+    daily_counts = {row['date']: {'visitors': row['visitors'], 'breaches': row['breaches']} for row in daily_rows}
     
     conn.close()
     
@@ -1134,56 +1453,108 @@ def insights():
                          attendance_data=json.dumps(attendance_data),
                          monthly_comparison=json.dumps(monthly_comparison),
                          calendar_data=json.dumps(calendar_data),
-                         geo_fence_breaches=geo_fence_breaches,
-                         notifications=notifications)
+                         daily_counts=daily_counts)
+
+@app.route('/user_breaches/<user_id>')
+def user_breaches(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT timestamp, photo_path FROM geo_fence
+        WHERE user_id = ? AND status = 'Zone Breach'
+        ORDER BY timestamp DESC
+    """, (user_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    return jsonify([
+        {
+            'image_url': row['photo_path'],
+            'thumb_url': thumbnail_path(row['photo_path']),
+            'date': row['timestamp'].split(' ')[0] if ' ' in row['timestamp'] else row['timestamp'],
+            'time': row['timestamp'].split(' ')[1] if ' ' in row['timestamp'] else '00:00:00'
+        } for row in rows
+    ])
 
-# Replace the existing notifications route with this updated version
 @app.route('/notifications')
 def notifications():
+    # Rows are loaded by the page from /events/notifications
+    return render_template('notifications.html')
+
+# Listings behind the monitor and notification pages, paged by (timestamp, id) keyset
+EVENT_PAGE_SIZE = 50
+EVENT_PAGE_MAX = 200
+event_feeds = {
+    'visitors': EventFeed("kind = 'visitor'"),
+    'breaches': EventFeed("kind = 'breach' AND status = 'Zone Breach'"),
+    'notifications': EventFeed("kind != 'attendance'"),
+}
+
+@app.route('/events/<feed>')
+def event_feed(feed):
+    """Without a cursor: the newest page plus a since cursor. ?before= pages back, ?since= polls for newer rows."""
+    if feed not in event_feeds:
+        return jsonify({"status": "error", "message": f"Unknown feed: {feed}"}), 404
     try:
-        conn = sqlite3.connect('hostel.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT timestamp, photo_path, status FROM visitors ORDER BY timestamp DESC')
-        visitor_alerts = [
-            {
-                'type': row[2],
-                'hostelite_id': None,
-                'name': None,
-                'time': row[0].split(' ')[1] if ' ' in row[0] else row[0],
-                'date': row[0].split(' ')[0] if ' ' in row[0] else datetime.now().strftime('%Y-%m-%d'),
-                'message': f"Visitor detected",
-                'photo': row[1]
-            }
-            for row in cursor.fetchall()
-        ]
-
-        cursor.execute('SELECT timestamp, photo_path, status, user_id FROM geo_fence ORDER BY timestamp DESC')
-        geo_fence_alerts = [
-            {
-                'type': row[2],
-                'hostelite_id': row[3],
-                'name': None,
-                'time': row[0].split(' ')[1] if ' ' in row[0] else row[0],
-                'date': row[0].split(' ')[0] if ' ' in row[0] else datetime.now().strftime('%Y-%m-%d'),
-                'message': f"Zone breach detected",
-                'photo': row[1]
-            }
-            for row in cursor.fetchall()
-        ]
-
-        alerts = visitor_alerts + geo_fence_alerts
-        alerts.sort(key=lambda x: x['date'] + ' ' + x['time'], reverse=True)
-        
+        limit = min(int(request.args.get('limit', EVENT_PAGE_SIZE)), EVENT_PAGE_MAX)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be a number"}), 400
+    before = request.args.get('before')
+    since = request.args.get('since')
+    conn = db.connect()
+    try:
+        if since is not None:
+            events, since, more = event_feeds[feed].newer(conn, since, limit)
+            return jsonify({"status": "success", "events": events, "since": since, "more": more})
+        # One read transaction so the since cursor matches the page it is returned with
+        conn.execute('BEGIN')
+        events, next_cursor = event_feeds[feed].page(conn, before, limit)
+        payload = {"status": "success", "events": events, "next": next_cursor}
+        if before is None:
+            payload['since'] = EventFeed.latest(conn)
+        return jsonify(payload)
+    except FeedCursorError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    finally:
         conn.close()
-        return render_template('notifications.html', alerts=alerts)
-    except Exception as e:
-        logging.error(f"Error in notifications: {str(e)}")
-        if 'conn' in locals():
-            conn.close()
-        return render_template('notifications.html', alerts=[], error=str(e))
+
+@app.route('/live_events')
+def live_events():
+    """Server-sent events for dashboards: ?topics=attendance,visitor,breach,stats (default all)."""
+    topics = [t for t in request.args.get('topics', '').split(',') if t]
+    unknown = [t for t in topics if t not in LIVE_TOPICS]
+    if unknown:
+        return jsonify({"status": "error", "message": f"Unknown topics: {', '.join(unknown)}"}), 400
+    try:
+        subscription = event_broker.subscribe(topics)
+    except BrokerFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    # Counts may have moved while the client was away, so a stats subscriber starts from a fresh copy
+    snapshot = None
+    if subscription.wants('stats'):
+        conn = db.connect()
+        snapshot = sse_message('stats', dashboard_counts(conn))
+        conn.close()
+
+    def stream():
+        try:
+            # Browsers reconnect after this long when the stream ends, e.g. after an eviction
+            yield 'retry: 5000\n\n'
+            if snapshot:
+                yield snapshot
+            while True:
+                messages = subscription.get(timeout=LIVE_KEEPALIVE_SECONDS)
+                if messages is None:
+                    break
+                # A comment line on idle streams notices closed connections and keeps proxies from timing out
+                yield ''.join(messages) if messages else ': keepalive\n\n'
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/individual_history/<user_id>')
+@versioned_view('attendance')
 def individual_history(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -1208,6 +1579,7 @@ def individual_history(user_id):
     ])
 
 @app.route('/date_report/<date>')
+@versioned_view('attendance', 'users')
 def date_report(date):
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -1237,5 +1609,145 @@ def date_report(date):
     ]
     conn.close()
     return jsonify({'present_list': present_list, 'absent_list': absent_list})
+@app.cli.command('benchmark-detectors')
+@click.argument('folder')
+@click.option('--backends', default='mtcnn,haar,cascade', help='Comma-separated detector backends to compare.')
+@click.option('--reference', default=None, help='JSON file mapping frame file names to ground-truth [x, y, w, h] boxes.')
+@click.option('--iou', default=0.5, help='IoU needed for a detection to count as a hit.')
+def benchmark_detectors(folder, backends, reference, iou):
+    """Report per-backend detection latency and recall on a folder of frames.
+
+    Without --reference, the first backend's detections are the ground truth.
+    """
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        img = cv2.imread(os.path.join(folder, name))
+        if img is not None:
+            frames.append((name, cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+    if not frames:
+        raise click.ClickException(f"No readable images in {folder}")
+    truth = None
+    if reference:
+        with open(reference) as f:
+            truth = json.load(f)
+    detectors = {name: face_detectors.get(name) for name in backends.split(',')}
+    report = benchmark(detectors, frames, truth, iou)
+    click.echo(f"{'backend':<10} {'frames':>6} {'faces':>6} {'mean ms':>8} {'p95 ms':>8} {'recall':>7}")
+    for name, row in report.items():
+        recall = '-' if row['recall'] is None else f"{row['recall']:.3f}"
+        click.echo(f"{name:<10} {row['frames']:>6} {row['faces']:>6} {row['mean_ms']:>8} {row['p95_ms']:>8} {recall:>7}")
+
+@app.cli.command('build-thumbnails')
+def build_thumbnails():
+    """Write missing thumbnails for visitor and breach photos saved before the photo store had them."""
+    conn = db.connect()
+    paths = [row[0] for row in conn.execute(
+        "SELECT DISTINCT photo_path FROM events WHERE kind != 'attendance' AND photo_path IS NOT NULL")]
+    conn.close()
+    built = missing = 0
+    for path in paths:
+        if os.path.exists(thumbnail_path(path)):
+            continue
+        if photo_store.make_thumbnail(path):
+            built += 1
+        else:
+            missing += 1
+    click.echo(f"Built {built} thumbnails ({missing} photos missing or unreadable)")
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats():
+    """Recompute the dashboard summary tables from the attendance, visitors and geo_fence tables."""
+    event_writer.flush()
+    conn = db.connect()
+    conn.execute('BEGIN IMMEDIATE')
+    rebuild_summaries(conn.cursor())
+    # Views built from the old summaries must not be answered from cache or with a 304
+    conn.execute('UPDATE data_versions SET version = version + 1')
+    conn.commit()
+    days = conn.execute('SELECT COUNT(*) FROM daily_stats').fetchone()[0]
+    conn.close()
+    click.echo(f"Rebuilt summary tables ({days} days)")
+
+# Report pages and the tables they must reach through an index rather than a full scan
+QUERY_PLAN_ROUTES = ['/home', '/attendance', '/insights', '/individual_history/{user_id}', '/date_report/{date}',
+                     '/user_breaches/{user_id}', '/events/visitors', '/events/breaches', '/events/notifications',
+                     '/events/notifications?before=4102444800|0', '/events/notifications?since=0']
+QUERY_PLAN_TABLES = ('attendance', 'visitors', 'geo_fence', 'embeddings', 'events')
+
+def seed_query_plan_db(conn, users=200, days=60, alerts=2000):
+    """Fill a freshly migrated database with enough history that a missing index shows up as a scan."""
+    today = datetime.now()
+    conn.executemany(
+        'INSERT INTO users (user_id, role, name, age, contact, email) VALUES (?, ?, ?, ?, ?, ?)',
+        [(f"HST-{i:04d}", 'hostelite', f"User {i}", 20, '0', f"user{i}@example.com") for i in range(1, users + 1)])
+    conn.executemany(
+        'INSERT INTO attendance (user_id, date, time, status, confidence) VALUES (?, ?, ?, ?, ?)',
+        [(f"HST-{i:04d}", (today - timedelta(days=d)).strftime('%Y-%m-%d'), '08:00:00', 'Present', 90.0)
+         for d in range(days) for i in range(1, users + 1) if (i + d) % 3])
+    stamps = [(today - timedelta(minutes=7 * n)).strftime('%Y-%m-%d %H:%M:%S') for n in range(alerts)]
+    conn.executemany('INSERT INTO visitors (timestamp, photo_path, status) VALUES (?, ?, ?)',
+                     [(ts, f"visitor_{n}.jpg", 'Visitor') for n, ts in enumerate(stamps)])
+    conn.executemany('INSERT INTO geo_fence (timestamp, photo_path, status, user_id) VALUES (?, ?, ?, ?)',
+                     [(ts, f"breach_{n}.jpg", 'Zone Breach', f"HST-{n % users + 1:04d}") for n, ts in enumerate(stamps)])
+    conn.commit()
+    # Give the planner real statistics, as a long-running database would have
+    conn.execute('ANALYZE')
+    conn.commit()
+
+@app.cli.command('check-query-plans')
+@click.option('--user-id', default='HST-0001', help='User for /individual_history.')
+@click.option('--live', is_flag=True, help='Check against hostel.db instead of a seeded scratch database.')
+def check_query_plans(user_id, live):
+    """Request each report page and fail if its queries full-scan an event table.
+
+    By default the schema is built from the migrations in a temporary database
+    and seeded with synthetic history, so the check runs the same anywhere
+    (e.g. in CI) and exits non-zero on a regression.
+    """
+    global db
+    # Only the report queries matter here; don't start cameras or load the face models
+    app.config['CAPTURE_WORKERS'] = False
+    app.config['MODEL_WARMUP'] = False
+    live_db = db
+    scratch = None
+    if not live:
+        scratch = tempfile.TemporaryDirectory()
+        db = Database(os.path.join(scratch.name, 'query_plans.db'))
+        conn = db.connect()
+        migrate(conn)
+        seed_query_plan_db(conn)
+        conn.close()
+    # Cached responses would answer without running any query
+    response_cache.clear()
+    statements = []
+    db.trace_callback = statements.append
+    client = app.test_client()
+    failures = 0
+    try:
+        for route in QUERY_PLAN_ROUTES:
+            url = route.format(user_id=user_id, date=datetime.now().strftime('%Y-%m-%d'))
+            del statements[:]
+            status = client.get(url).status_code
+            selects = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+            conn = db.connect()
+            scans = sorted({table for sql in selects for table in full_table_scans(conn, sql)
+                            if table in QUERY_PLAN_TABLES})
+            conn.close()
+            failures += bool(scans) or status != 200
+            click.echo(f"{url:<32} {status} {len(selects):>3} queries  "
+                       f"{'full scan of ' + ', '.join(scans) if scans else 'ok'}")
+    finally:
+        db.trace_callback = None
+        if scratch is not None:
+            db.close_all()
+            db = live_db
+            response_cache.clear()
+            scratch.cleanup()
+    if failures:
+        raise click.ClickException(f"{failures} route(s) failed or scan whole event tables")
+
 if __name__ == '__main__':
+    # With the reloader on, only the serving child should load the models
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        models.start_warmup()
     app.run(debug=True)
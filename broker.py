@@ -0,0 +1,121 @@
+import json
+import logging
+import threading
+from collections import deque
+
+
+class BrokerFull(Exception):
+    pass
+
+
+def sse_message(event, data, event_id=None):
+    """One server-sent event in wire format."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in json.dumps(data).splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One connected client: a bounded buffer of formatted messages waiting to be sent."""
+
+    def __init__(self, topics, buffer_size):
+        self.topics = frozenset(topics) if topics else None
+        self.buffer_size = buffer_size
+        self.evicted = False
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def offer(self, message):
+        """Queue a message; returns False if the buffer is full."""
+        with self._cond:
+            if self._closed:
+                return True
+            if len(self._buffer) >= self.buffer_size:
+                return False
+            self._buffer.append(message)
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Wait for messages; returns all buffered ones, [] on timeout, or None once closed."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._buffer or self._closed, timeout)
+            if self._closed:
+                return None
+            messages = list(self._buffer)
+            self._buffer.clear()
+            return messages
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._buffer.clear()
+            self._cond.notify_all()
+
+
+class EventBroker:
+    """Fans published events out to server-sent event clients in this process.
+
+    publish() never blocks: each message is formatted once and offered to the
+    buffer of every client subscribed to its topic. A client whose buffer is
+    already full is not keeping up with its connection, so it is evicted
+    rather than allowed to hold memory or delay the others; its stream ends
+    and the browser reconnects and reloads what it shows.
+    """
+
+    def __init__(self, buffer_size=100, max_clients=50):
+        self.buffer_size = buffer_size
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self.stats = {'published': 0, 'delivered': 0, 'evicted': 0, 'rejected': 0, 'subscribed': 0}
+
+    def subscribe(self, topics=None):
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self.stats['rejected'] += 1
+                raise BrokerFull(f"Already serving {self.max_clients} live event clients")
+            subscription = Subscription(topics, self.buffer_size)
+            self._subscribers.add(subscription)
+            self.stats['subscribed'] += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.close()
+
+    @property
+    def clients(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, topic, data, event_id=None):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.wants(topic)]
+            self.stats['published'] += 1
+        if not subscribers:
+            return 0
+        message = sse_message(topic, data, event_id)
+        slow = [s for s in subscribers if not s.offer(message)]
+        for subscription in slow:
+            subscription.evicted = True
+            self.unsubscribe(subscription)
+        if slow:
+            logging.warning(f"Evicted {len(slow)} live event clients with full buffers")
+        with self._lock:
+            self.stats['delivered'] += len(subscribers) - len(slow)
+            self.stats['evicted'] += len(slow)
+        return len(subscribers) - len(slow)
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, clients=len(self._subscribers), buffer_size=self.buffer_size,
+                        max_clients=self.max_clients)
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+import cv2
+from streaming import LatestFrame
+
+
+def open_source(source):
+    """Open an RTSP/HTTP URL, a video file path, or a local device index given as digits."""
+    return cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+
+
+class CaptureWorker:
+    """Samples frames from one cv2.VideoCapture source and runs them through a frame handler.
+
+    A reader thread keeps pulling frames so a network camera's buffer never
+    fills up (files are read at their native frame rate and loop at the end)
+    and hands one frame every 1/fps seconds to the processing thread through a
+    single-slot mailbox. When processing falls behind, the older sample is
+    dropped and counted; lag is the age of a frame when its processing starts.
+    """
+
+    def __init__(self, camera, handler, ready=None, opener=open_source, reconnect_seconds=5):
+        self.camera = camera
+        self.camera_id = camera['camera_id']
+        self.handler = handler
+        self.ready = ready
+        self.opener = opener
+        self.reconnect_seconds = reconnect_seconds
+        self.interval = 1.0 / max(float(camera.get('fps') or 1), 0.01)
+        self.slot = LatestFrame()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.started = None
+        self.stats = {
+            'read': 0, 'sampled': 0, 'processed': 0, 'dropped': 0, 'errors': 0,
+            'read_failures': 0, 'reconnects': 0, 'lag_total': 0.0, 'max_lag': 0.0,
+            'processing_total': 0.0, 'last_status': None,
+        }
+        self._threads = []
+
+    def start(self):
+        self.started = time.time()
+        for target, name in ((self._read, 'reader'), (self._process, 'processor')):
+            thread = threading.Thread(target=target, name=f'capture-{self.camera_id}-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self.slot.close()
+
+    def alive(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _read(self):
+        source = self.camera['source']
+        while not self._stop.is_set():
+            cap = self.opener(source)
+            if not cap.isOpened():
+                logging.error(f"Camera {self.camera_id}: cannot open {source}, retrying in {self.reconnect_seconds}s")
+                self._count('reconnects')
+                self._stop.wait(self.reconnect_seconds)
+                continue
+            # Files would otherwise be read as fast as the disk allows
+            native_fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            is_file = frame_count > 0
+            pace = 1.0 / native_fps if is_file and native_fps > 0 else 0
+            next_sample = time.time()
+            next_read = time.time()
+            while not self._stop.is_set():
+                if pace:
+                    delay = next_read - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_read = max(next_read + pace, time.time() - pace)
+                ok, frame = cap.read()
+                if not ok:
+                    if is_file:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    logging.error(f"Camera {self.camera_id}: read failed, reconnecting")
+                    self._count('read_failures')
+                    break
+                self._count('read')
+                now = time.time()
+                if now < next_sample:
+                    continue
+                next_sample = max(next_sample + self.interval, now)
+                self._count('sampled')
+                if self.slot.put((now, frame)):
+                    self._count('dropped')
+            cap.release()
+            if not self._stop.is_set():
+                self._count('reconnects')
+                self._stop.wait(self.reconnect_seconds)
+
+    def _process(self):
+        while True:
+            item = self.slot.take()
+            if item is None:
+                return
+            captured, frame = item
+            if self.ready is not None and not self.ready():
+                self._count('dropped')
+                continue
+            started = time.time()
+            try:
+                payload, _ = self.handler(frame)
+                status = payload.get('status')
+            except Exception as e:
+                logging.error(f"Camera {self.camera_id}: frame failed: {str(e)}")
+                status = 'error'
+            finished = time.time()
+            with self._lock:
+                lag = started - captured
+                self.stats['processed'] += 1
+                self.stats['errors'] += status == 'error'
+                self.stats['lag_total'] += lag
+                self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+                self.stats['processing_total'] += finished - started
+                self.stats['last_status'] = status
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        processed = stats['processed']
+        uptime = time.time() - self.started if self.started else 0
+        lag_total = stats.pop('lag_total')
+        processing_total = stats.pop('processing_total')
+        stats.update({
+            'mode': self.camera['mode'],
+            'fps_target': round(1.0 / self.interval, 2),
+            'fps_processed': round(processed / uptime, 2) if uptime else 0,
+            'avg_lag_ms': round(1000 * lag_total / processed, 1) if processed else 0,
+            'max_lag_ms': round(1000 * stats['max_lag'], 1),
+            'avg_processing_ms': round(1000 * processing_total / processed, 1) if processed else 0,
+            'running': self.alive(),
+        })
+        del stats['max_lag']
+        return stats
+
+
+class CaptureManager:
+    """Keeps one CaptureWorker running per enabled camera row."""
+
+    def __init__(self, handler_factory, ready=None, opener=open_source):
+        self.handler_factory = handler_factory
+        self.ready = ready
+        self.opener = opener
+        self._lock = threading.Lock()
+        self._workers = {}
+
+    def sync(self, cameras):
+        """Start, restart or stop workers so they match the given camera configs."""
+        wanted = {c['camera_id']: c for c in cameras if c.get('enabled', 1)}
+        with self._lock:
+            for camera_id in list(self._workers):
+                worker = self._workers[camera_id]
+                if wanted.get(camera_id) != worker.camera:
+                    worker.stop()
+                    del self._workers[camera_id]
+                    logging.debug(f"Stopped capture for camera {camera_id}")
+            for camera_id, camera in wanted.items():
+                if camera_id in self._workers:
+                    continue
+                handler = self.handler_factory(camera)
+                if handler is None:
+                    logging.error(f"Camera {camera_id}: unknown mode {camera['mode']}")
+                    continue
+                worker = CaptureWorker(camera, handler, ready=self.ready, opener=self.opener)
+                worker.start()
+                self._workers[camera_id] = worker
+                logging.debug(f"Started capture for camera {camera_id} ({camera['mode']}, {camera['source']})")
+
+    def stop_all(self):
+        self.sync([])
+
+    def metrics(self):
+        with self._lock:
+            workers = dict(self._workers)
+        return {camera_id: worker.metrics() for camera_id, worker in workers.items()}
@@ -0,0 +1,150 @@
+import logging
+import re
+import sqlite3
+import threading
+
+
+class PooledConnection:
+    """A pooled sqlite3 connection as handed to callers.
+
+    Mirrors the parts of sqlite3.Connection the app uses. row_factory applies
+    to cursors made through this handle only, since the underlying connection
+    is shared over time with other callers. close() rolls back anything left
+    uncommitted and returns the connection to the pool.
+    """
+
+    def __init__(self, database, conn, row_factory=None):
+        self._database = database
+        self._conn = conn
+        self.row_factory = row_factory
+
+    def _connection(self):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return self._conn
+
+    def cursor(self):
+        cursor = self._connection().cursor()
+        cursor.row_factory = self.row_factory
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self._connection().commit()
+
+    def rollback(self):
+        self._connection().rollback()
+
+    @property
+    def in_transaction(self):
+        return self._connection().in_transaction
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._database.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+
+
+class Database:
+    """Pool of SQLite connections to one file, configured for concurrent readers and writers.
+
+    Connections are opened once and reused across requests and worker threads
+    (each is used by one thread at a time). The database runs in WAL mode so
+    readers never wait for a writer. synchronous=NORMAL is safe with WAL and
+    avoids an fsync per commit. busy_timeout makes a writer wait for the lock
+    instead of failing with "database is locked".
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000, synchronous='NORMAL', cache_size_kib=16384,
+                 journal_mode='WAL', max_idle=16):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.journal_mode = journal_mode
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._journal_checked = False
+        # Called with the text of every statement run on a checked-out connection (see check-query-plans)
+        self.trace_callback = None
+        self._stats = {'opened': 0, 'reused': 0, 'discarded': 0}
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        if not self._journal_checked:
+            # journal_mode is stored in the file, so one connection setting it is enough
+            mode = conn.execute(f'PRAGMA journal_mode = {self.journal_mode}').fetchone()[0]
+            if mode.upper() != self.journal_mode.upper():
+                logging.warning(f"SQLite journal mode is {mode}, wanted {self.journal_mode}")
+            self._journal_checked = True
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = {-int(self.cache_size_kib)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def connect(self, row_factory=None):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats['reused' if conn is not None else 'opened'] += 1
+        if conn is None:
+            conn = self._open()
+        conn.set_trace_callback(self.trace_callback)
+        return PooledConnection(self, conn, row_factory)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats['discarded'] += 1
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), journal_mode=self.journal_mode)
+
+
+def full_table_scans(conn, sql):
+    """Tables that EXPLAIN QUERY PLAN says sql reads with a full scan (no index)."""
+    # Plans name a table by its alias when the query gives it one
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        if alias and alias.upper() not in ('WHERE', 'JOIN', 'LEFT', 'INNER', 'ON', 'ORDER', 'GROUP', 'UNION', 'LIMIT'):
+            aliases[alias] = table
+    scans = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall():
+        match = re.match(r'SCAN (\w+)$', row[-1])
+        if match:
+            scans.append(aliases.get(match.group(1), match.group(1)))
+    return scans
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from tracking import box_iou
+
+# MTCNN's default min_face_size: faces smaller than this in the image it sees are not found
+MTCNN_MIN_FACE = 20
+
+
+def detection_scale(width, target_width, min_face_size, detector_min_face=MTCNN_MIN_FACE):
+    """Scale factor for the detection pass: shrink towards target_width, but never so far
+    that a min_face_size face ends up smaller than the detector can see."""
+    if not target_width or width <= target_width:
+        return 1.0
+    return min(1.0, max(target_width / width, detector_min_face / min_face_size))
+
+
+def scale_face(face, factor, dx=0, dy=0):
+    """Map an MTCNN-style result from detection coordinates back to the original frame."""
+    x, y, w, h = face['box']
+    face['box'] = [int(round(x * factor)) + dx, int(round(y * factor)) + dy,
+                   int(round(w * factor)), int(round(h * factor))]
+    face['keypoints'] = {name: (int(round(px * factor)) + dx, int(round(py * factor)) + dy)
+                         for name, (px, py) in face.get('keypoints', {}).items()}
+    return face
+
+
+def detect_downscaled(detector, img_rgb, target_width=640, min_face_size=40, dx=0, dy=0):
+    """Run detector on a shrunk copy of img_rgb and return boxes in full-resolution coordinates.
+
+    Faces smaller than min_face_size pixels (full resolution) are dropped; they
+    are too small for a reliable 160x160 embedding crop anyway. dx/dy offset the
+    results when img_rgb is a region cut out of a larger frame.
+    """
+    height, width = img_rgb.shape[:2]
+    scale = detection_scale(width, target_width, min_face_size, getattr(detector, 'min_face', MTCNN_MIN_FACE))
+    if scale < 1.0:
+        small = cv2.resize(img_rgb, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = img_rgb
+    faces = [scale_face(face, 1.0 / scale, dx, dy) for face in detector.detect_faces(small)]
+    return [f for f in faces if min(f['box'][2], f['box'][3]) >= min_face_size]
+
+
+# Every backend exposes detect_faces(img_rgb) returning MTCNN-style dicts:
+# {'box': [x, y, w, h], 'confidence': float, 'keypoints': {...}}
+
+
+class HaarDetector:
+    """OpenCV's bundled frontal-face Haar cascade. Very fast on CPU, but less accurate than
+    MTCNN and without calibrated scores, so every hit is reported with confidence 1.0."""
+
+    min_face = 30
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5):
+        cascade_path = cascade_path or os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"Could not load Haar cascade from {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect_faces(self, img_rgb):
+        gray = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(self.min_face, self.min_face))
+        return [{'box': [int(x), int(y), int(w), int(h)], 'confidence': 1.0, 'keypoints': {}} for x, y, w, h in boxes]
+
+
+class DnnDetector:
+    """OpenCV DNN face detector (the res10 300x300 SSD), loaded from local Caffe model files."""
+
+    min_face = 30
+
+    def __init__(self, prototxt, model, min_confidence=0.5, input_size=300):
+        for path in (prototxt, model):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"DNN face detector file not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+        self._lock = threading.Lock()
+
+    def detect_faces(self, img_rgb):
+        height, width = img_rgb.shape[:2]
+        size = self.input_size
+        # The model was trained on BGR input with these channel means
+        blob = cv2.dnn.blobFromImage(cv2.resize(img_rgb, (size, size)), 1.0, (size, size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()[0, 0]
+        faces = []
+        for _, _, confidence, x1, y1, x2, y2 in detections:
+            if confidence < self.min_confidence:
+                continue
+            x1, x2 = int(max(0.0, x1) * width), int(min(1.0, x2) * width)
+            y1, y2 = int(max(0.0, y1) * height), int(min(1.0, y2) * height)
+            if x2 > x1 and y2 > y1:
+                faces.append({'box': [x1, y1, x2 - x1, y2 - y1], 'confidence': float(confidence), 'keypoints': {}})
+        return faces
+
+
+class CascadeDetector:
+    """A fast detector proposes face regions and an accurate one confirms them.
+
+    The confirmer only sees each padded proposal, so on a frame with one or two
+    people MTCNN runs on a few small crops instead of the whole image. Faces the
+    proposer misses are missed; use this where speed matters more than recall.
+    """
+
+    def __init__(self, proposer, confirmer, padding=0.4):
+        self.proposer = proposer
+        self.confirmer = confirmer
+        self.padding = padding
+        self.min_face = getattr(proposer, 'min_face', MTCNN_MIN_FACE)
+
+    def detect_faces(self, img_rgb):
+        height, width = img_rgb.shape[:2]
+        faces = []
+        for proposal in self.proposer.detect_faces(img_rgb):
+            x, y, w, h = proposal['box']
+            pad = int(self.padding * max(w, h))
+            x0, y0 = max(0, x - pad), max(0, y - pad)
+            x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+            crop = np.ascontiguousarray(img_rgb[y0:y1, x0:x1])
+            for face in self.confirmer.detect_faces(crop):
+                face = scale_face(face, 1.0, x0, y0)
+                # Padded proposals can overlap; keep one detection per face
+                if all(box_iou(face['box'], other['box']) < 0.5 for other in faces):
+                    faces.append(face)
+        return faces
+
+
+class DetectorRegistry:
+    """Builds detector backends by name on first use."""
+
+    def __init__(self, factories):
+        self._factories = dict(factories)
+        self._built = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return list(self._factories)
+
+    def get(self, name):
+        if name not in self._factories:
+            raise ValueError(f"Unknown detector backend: {name}")
+        detector = self._built.get(name)
+        if detector is None:
+            with self._lock:
+                detector = self._built.get(name)
+                if detector is None:
+                    detector = self._built[name] = self._factories[name]()
+        return detector
+
+
+def benchmark(detectors, frames, reference=None, iou_threshold=0.5, min_confidence=0.9):
+    """Time each backend over frames and measure recall against reference boxes.
+
+    detectors maps names to backends, frames is a list of (name, rgb image) and
+    reference maps frame names to ground-truth boxes. Without a reference the
+    first backend's detections are used as ground truth.
+    """
+    names = list(detectors)
+    found = {name: {} for name in names}
+    timings = {name: [] for name in names}
+    for frame_name, img_rgb in frames:
+        for name in names:
+            start = time.perf_counter()
+            faces = detectors[name].detect_faces(img_rgb)
+            timings[name].append(time.perf_counter() - start)
+            found[name][frame_name] = [f['box'] for f in faces if f['confidence'] >= min_confidence]
+    if reference is None:
+        reference = found[names[0]]
+    total = sum(len(boxes) for boxes in reference.values())
+    report = {}
+    for name in names:
+        hits = 0
+        for frame_name, truth in reference.items():
+            unmatched = list(found[name].get(frame_name, []))
+            for box in truth:
+                best = max(unmatched, key=lambda other: box_iou(box, other), default=None)
+                if best is not None and box_iou(box, best) >= iou_threshold:
+                    unmatched.remove(best)
+                    hits += 1
+        latencies = np.array(timings[name]) * 1000
+        report[name] = {
+            'frames': len(latencies),
+            'faces': sum(len(boxes) for boxes in found[name].values()),
+            'mean_ms': round(float(latencies.mean()), 2) if len(latencies) else 0,
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2) if len(latencies) else 0,
+            'recall': round(hits / total, 3) if total else None,
+        }
+    return report
@@ -0,0 +1,173 @@
+import os
+import pickle
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+MAGIC = b'HVEMB'
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('dim', '<u4'),
+    ('id_width', '<u4'),
+    ('reserved', '<u4'),
+    ('generation', '<u8'),
+])
+ALIVE = 1
+DEAD = 0
+
+
+def record_dtype(dim, id_width):
+    return np.dtype([('user_id', f'S{id_width}'), ('flags', '<u4'), ('vector', '<f4', (dim,))])
+
+
+class EmbeddingStore:
+    """Append-only file of fixed-width float32 embedding rows, read through a memory map.
+
+    Layout: a 64-byte header (magic, format version, dim, id width, generation
+    counter) followed by records of (user_id, flags, vector). Each enrollment
+    appends one contiguous run of rows for the user and tombstones the previous
+    run, so a user's live templates are always adjacent. Every write bumps the
+    header generation so other processes mapping the same file know to remap.
+    """
+
+    def __init__(self, path, dim=512, id_width=32):
+        self.path = path
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            self._create(dim, id_width)
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{path} is not an embedding store")
+        if header['version'] != VERSION:
+            raise ValueError(f"Unsupported embedding store version {header['version']} in {path}")
+        self.dim = int(header['dim'])
+        self.id_width = int(header['id_width'])
+        self.dtype = record_dtype(self.dim, self.id_width)
+        self._header = None
+        self._inode = None
+        self.generation = None
+        self.records = None
+        self.refresh()
+
+    def _create(self, dim, id_width):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['dim'] = dim
+        header['id_width'] = id_width
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header.tobytes().ljust(HEADER_SIZE, b'\x00'))
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def changed(self):
+        if os.stat(self.path).st_ino != self._inode:
+            return True
+        return int(self._header[0]['generation']) != self.generation
+
+    def refresh(self):
+        """Remap the file if another writer (thread or process) has changed it."""
+        inode = os.stat(self.path).st_ino
+        if inode != self._inode:
+            # compact() swaps in a new file, so the header map must follow it
+            self._header = np.memmap(self.path, dtype=HEADER_DTYPE, mode='r', shape=(1,))
+            self._inode = inode
+        generation = int(self._header[0]['generation'])
+        count = (os.path.getsize(self.path) - HEADER_SIZE) // self.dtype.itemsize
+        if count:
+            self.records = np.memmap(self.path, dtype=self.dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=self.dtype)
+        self.generation = generation
+        return self.records
+
+    def _locked(self, f):
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+    def _bump(self, f):
+        f.seek(HEADER_DTYPE.fields['generation'][1])
+        current = np.frombuffer(f.read(8), dtype='<u8')[0]
+        f.seek(HEADER_DTYPE.fields['generation'][1])
+        f.write(np.array([current + 1], dtype='<u8').tobytes())
+
+    def _tombstone(self, f, user_id):
+        key = user_id.encode()
+        records = self.refresh()
+        rows = np.flatnonzero((records['user_id'] == key) & (records['flags'] == ALIVE))
+        flags_offset = self.dtype.fields['flags'][1]
+        for row in rows:
+            f.seek(HEADER_SIZE + int(row) * self.dtype.itemsize + flags_offset)
+            f.write(np.array([DEAD], dtype='<u4').tobytes())
+        return len(rows)
+
+    def put(self, user_id, embeddings):
+        """Tombstone the user's current rows and append the new ones."""
+        if len(user_id.encode()) > self.id_width:
+            raise ValueError(f"user_id longer than {self.id_width} bytes: {user_id}")
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32)).reshape(-1, self.dim)
+        rows = np.zeros(len(vectors), dtype=self.dtype)
+        rows['user_id'] = user_id.encode()
+        rows['flags'] = ALIVE
+        rows['vector'] = vectors
+        with self._lock, open(self.path, 'r+b') as f:
+            self._locked(f)
+            self._tombstone(f, user_id)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+            self._bump(f)
+            f.flush()
+        self.refresh()
+
+    def delete(self, user_id):
+        with self._lock, open(self.path, 'r+b') as f:
+            self._locked(f)
+            removed = self._tombstone(f, user_id)
+            if removed:
+                self._bump(f)
+            f.flush()
+        self.refresh()
+        return removed
+
+    def live(self):
+        """Return (user ids per row, float32 row matrix view, alive mask) without copying the vectors."""
+        records = self.records
+        return np.char.decode(records['user_id']), records['vector'], records['flags'] == ALIVE
+
+    def compact(self):
+        """Rewrite the file without tombstoned rows."""
+        with self._lock, open(self.path, 'r+b') as f:
+            self._locked(f)
+            records = self.refresh()
+            keep = np.asarray(records[records['flags'] == ALIVE])
+            header = np.frombuffer(f.read(HEADER_SIZE)[:HEADER_DTYPE.itemsize], dtype=HEADER_DTYPE).copy()
+            header['generation'] += 1
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as out:
+                out.write(header.tobytes().ljust(HEADER_SIZE, b'\x00'))
+                out.write(keep.tobytes())
+            os.replace(tmp_path, self.path)
+        self.refresh()
+
+
+def migrate_from_table(store, conn):
+    """One-shot copy of the latest pickled embedding per user from the embeddings table."""
+    cursor = conn.cursor()
+    cursor.execute('SELECT user_id, embedding FROM embeddings ORDER BY id')
+    latest = {}
+    for user_id, emb_blob in cursor.fetchall():
+        emb = np.asarray(pickle.loads(emb_blob), dtype=np.float32)
+        latest[user_id] = emb / np.linalg.norm(emb, axis=-1, keepdims=True)
+    for user_id, emb in latest.items():
+        store.put(user_id, emb)
+    return len(latest)
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime
+
+from photos import thumbnail_path
+
+
+class FeedCursorError(ValueError):
+    pass
+
+
+def parse_before(cursor):
+    """'ts|id' -> (ts, id)"""
+    try:
+        ts, row_id = cursor.split('|')
+        return int(ts), int(row_id)
+    except ValueError:
+        raise FeedCursorError(f"Invalid before cursor: {cursor}")
+
+
+def parse_since(cursor):
+    try:
+        return int(cursor or 0)
+    except ValueError:
+        raise FeedCursorError(f"Invalid since cursor: {cursor}")
+
+
+EVENT_COLUMNS = 'id, kind, source_id, ts, status, user_id, photo_path'
+
+
+def event_dict(row):
+    timestamp = datetime.fromtimestamp(row[3]).strftime('%Y-%m-%d %H:%M:%S')
+    date, time = timestamp.split(' ')
+    return {'id': row[0], 'kind': row[1], 'source_id': row[2], 'ts': row[3], 'timestamp': timestamp,
+            'date': date, 'time': time, 'status': row[4], 'user_id': row[5], 'photo': row[6],
+            'thumb': thumbnail_path(row[6])}
+
+
+class EventFeed:
+    """Newest-first listing of rows from the events table, paged by keyset instead of OFFSET.
+
+    where picks the feed's events and should line up with an index whose
+    trailing column is ts (kind = ? for idx_events_kind_ts, or the alerts
+    partial index's kind != 'attendance'). Pages are ordered by (ts, id) and
+    continue from a 'before' cursor, so each costs the same however deep it
+    is. Incremental polling uses the highest event id seen as a 'since'
+    cursor instead: ids grow in commit order, while timestamps are taken
+    before the write and can commit out of order under concurrent writers.
+    """
+
+    def __init__(self, where, params=()):
+        self.where = where
+        self.params = tuple(params)
+
+    def page(self, conn, before=None, limit=50):
+        """One page of events older than the before cursor; returns (events, next before cursor or None)."""
+        condition, params = '1', ()
+        if before is not None:
+            condition, params = '(ts, id) < (?, ?)', parse_before(before)
+        rows = conn.execute(f'SELECT {EVENT_COLUMNS} FROM events WHERE ({self.where}) AND {condition} '
+                            f'ORDER BY ts DESC, id DESC LIMIT ?', self.params + params + (limit,)).fetchall()
+        events = [event_dict(row) for row in rows]
+        if len(events) < limit:
+            return events, None
+        return events, f"{events[-1]['ts']}|{events[-1]['id']}"
+
+    @staticmethod
+    def latest(conn):
+        """The since cursor as of now, for a client that has just loaded the first page."""
+        return str(conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0])
+
+    def newer(self, conn, since, limit=200):
+        """Events committed after the since cursor, newest first; returns (events, new since cursor, more waiting)."""
+        last_id = parse_since(since)
+        # NOT INDEXED keeps the planner on the rowid range of new rows; the kind and ts indexes
+        # would otherwise look attractive and sort every matching row
+        rows = conn.execute(f'SELECT {EVENT_COLUMNS} FROM events NOT INDEXED WHERE ({self.where}) AND id > ? '
+                            f'ORDER BY id LIMIT ?', self.params + (last_id, limit)).fetchall()
+        if rows:
+            last_id = rows[-1][0]
+        events = sorted((event_dict(row) for row in rows), key=lambda e: (e['ts'], e['id']), reverse=True)
+        return events, str(last_id), len(rows) == limit
+
+
+class CommittedEvents:
+    """Follows the events table in id order, returning each committed event once.
+
+    Meant to be read right after a commit on the connection that made it.
+    Attendance events carry the user's name so a page can show the row
+    without asking the server for it.
+    """
+
+    def __init__(self, last_id=0):
+        self.last_id = last_id
+        self._lock = threading.Lock()
+
+    def seek(self, conn):
+        """Start from the newest event already in the table."""
+        with self._lock:
+            self.last_id = int(EventFeed.latest(conn))
+
+    def take(self, conn, limit=500):
+        with self._lock:
+            rows = conn.execute(f'SELECT {EVENT_COLUMNS}, (SELECT name FROM users WHERE users.user_id = events.user_id) '
+                                f'FROM events WHERE id > ? ORDER BY id LIMIT ?', (self.last_id, limit)).fetchall()
+            if rows:
+                self.last_id = rows[-1][0]
+        return [dict(event_dict(row), name=row[7]) for row in rows]
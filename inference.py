@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class InferenceQueueFull(Exception):
+    pass
+
+
+class BatchingEmbedder:
+    """Coalesces face crops from concurrent requests into one embeddings call.
+
+    Callers block in embeddings() exactly as with FaceNet. A single worker
+    thread takes the first waiting request, keeps collecting for up to
+    max_wait_ms or until max_batch faces are queued, runs one batched model call
+    and hands each caller back its own slice of the result.
+    """
+
+    def __init__(self, embed_fn, max_batch=32, max_wait_ms=5, max_queue=256, timeout=30):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'faces': 0,
+            'batches': 0,
+            'max_batch_seen': 0,
+            'max_queue_depth': 0,
+            'rejected': 0,
+            'queue_wait_total': 0.0,
+            'inference_total': 0.0,
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+                self._thread.start()
+
+    def embeddings(self, face_imgs):
+        face_imgs = np.asarray(face_imgs)
+        if len(face_imgs) == 0:
+            return np.empty((0, 512), dtype=np.float32)
+        self.start()
+        future = Future()
+        try:
+            self._queue.put_nowait((face_imgs, future, time.time()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise InferenceQueueFull("Inference queue is full, frame dropped")
+        with self._stats_lock:
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+        return future.result(timeout=self.timeout)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        faces = len(pending[0][0])
+        deadline = time.time() + self.max_wait
+        while faces < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            faces += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            started = time.time()
+            try:
+                batch = np.concatenate([imgs for imgs, _, _ in pending])
+                result = np.asarray(self.embed_fn(batch))
+            except Exception as e:
+                logging.error(f"Batched inference failed: {str(e)}")
+                for _, future, _ in pending:
+                    future.set_exception(e)
+                continue
+            elapsed = time.time() - started
+            offset = 0
+            for imgs, future, _ in pending:
+                future.set_result(result[offset:offset + len(imgs)])
+                offset += len(imgs)
+            with self._stats_lock:
+                self._stats['requests'] += len(pending)
+                self._stats['faces'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], len(batch))
+                self._stats['queue_wait_total'] += sum(started - queued for _, _, queued in pending)
+                self._stats['inference_total'] += elapsed
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches, requests = stats['batches'], stats['requests']
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': stats['max_queue_depth'],
+            'requests': requests,
+            'faces': stats['faces'],
+            'batches': batches,
+            'rejected': stats['rejected'],
+            'avg_batch_size': round(stats['faces'] / batches, 2) if batches else 0,
+            'max_batch_size': stats['max_batch_seen'],
+            'avg_queue_wait_ms': round(1000 * stats['queue_wait_total'] / requests, 2) if requests else 0,
+            'avg_inference_ms': round(1000 * stats['inference_total'] / batches, 2) if batches else 0,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000,
+        }
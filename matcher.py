@@ -0,0 +1,251 @@
+import threading
+from collections import namedtuple
+import numpy as np
+
+
+def select_templates(embeddings, max_templates, max_iter=20):
+    """Pick up to max_templates representative rows with k-medoids on cosine distance."""
+    X = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if not max_templates or len(X) <= max_templates:
+        return X
+    D = 1.0 - X @ X.T
+    # Deterministic farthest-point seeding from the most central sample
+    medoids = [int(np.argmin(D.sum(axis=1)))]
+    while len(medoids) < max_templates:
+        medoids.append(int(np.argmax(D[:, medoids].min(axis=1))))
+    for _ in range(max_iter):
+        labels = np.argmin(D[:, medoids], axis=1)
+        updated = []
+        for c, medoid in enumerate(medoids):
+            members = np.flatnonzero(labels == c)
+            if len(members) == 0:
+                updated.append(medoid)
+                continue
+            updated.append(int(members[np.argmin(D[np.ix_(members, members)].sum(axis=1))]))
+        if updated == medoids:
+            break
+        medoids = updated
+    return X[sorted(set(medoids))]
+
+
+_Snapshot = namedtuple('_Snapshot', 'ids matrix sq_norms starts owners seg_user live lookup')
+
+
+class GalleryMatcher:
+    """Enrolled embeddings kept as one contiguous matrix with a parallel id array.
+
+    Each user owns a contiguous run of template rows (one row for an averaged
+    embedding, several for a multi-template enrollment). Queries are scored in a
+    single matrix product, reduced to the best template per user with
+    np.minimum.reduceat, and the top-k users are picked with argpartition.
+
+    When an ANN index is attached and the gallery has at least ann_min_users
+    users, only the index shortlist is scored, still with exact distances.
+    """
+
+    def __init__(self, dim=512, dtype=np.float32, max_templates=None, block_rows=8192,
+                 index=None, ann_min_users=2000):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.max_templates = max_templates
+        self.block_rows = block_rows
+        self.index = index
+        self.ann_min_users = ann_min_users
+        self._lock = threading.Lock()
+        self._blocks = {}
+        # Row version per user when the rows come from an attached store (see attach)
+        self._versions = {}
+        self._snapshot = self._build([])
+
+    def __len__(self):
+        return len(self._snapshot.ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._blocks
+
+    def user_ids(self):
+        return list(self._snapshot.ids)
+
+    def template_count(self):
+        return int(np.count_nonzero(self._snapshot.seg_user[self._snapshot.owners] >= 0))
+
+    def nbytes(self):
+        return self._snapshot.matrix.nbytes
+
+    def _prepare(self, embeddings):
+        rows = np.atleast_2d(np.asarray(embeddings, dtype=np.float32)).reshape(-1, self.dim)
+        if self.max_templates and len(rows) > self.max_templates:
+            rows = select_templates(rows, self.max_templates)
+        return rows.astype(self.dtype)
+
+    def set(self, user_id, embeddings):
+        rows = self._prepare(embeddings)
+        with self._lock:
+            self._blocks[user_id] = rows
+            self._versions.pop(user_id, None)
+            self._snapshot = self._build(self._blocks.items())
+            if self.index is not None:
+                self.index.add(user_id, rows)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._blocks.pop(user_id, None) is None:
+                return
+            self._snapshot = self._build(self._blocks.items())
+            if self.index is not None:
+                self.index.remove(user_id)
+
+    def load(self, items):
+        blocks = {user_id: self._prepare(embeddings) for user_id, embeddings in items}
+        with self._lock:
+            self._blocks = blocks
+            self._versions = {}
+            self._snapshot = self._build(blocks.items())
+            if self.index is not None:
+                self.index.sync(blocks)
+
+    def attach(self, row_ids, matrix, alive):
+        """Serve an externally owned row matrix (e.g. a memory-mapped store) without copying it.
+
+        Rows belonging to one user must be adjacent; rows with alive False are
+        scored but never returned.
+        """
+        row_ids = np.asarray(row_ids, dtype=str)
+        alive = np.asarray(alive, dtype=bool)
+        if matrix.dtype != self.dtype:
+            matrix = matrix.astype(self.dtype)
+        if len(row_ids):
+            boundary = np.r_[True, (row_ids[1:] != row_ids[:-1]) | (alive[1:] != alive[:-1])]
+        else:
+            boundary = np.empty(0, dtype=bool)
+        starts = np.flatnonzero(boundary)
+        live = np.flatnonzero(alive[starts])
+        seg_user = np.full(len(starts), -1, dtype=np.intp)
+        seg_user[live] = np.arange(len(live))
+        owners = np.cumsum(boundary) - 1
+        ends = np.append(starts[1:], len(matrix))
+        ids = row_ids[starts[live]]
+        blocks = {user_id: matrix[starts[s]:ends[s]] for user_id, s in zip(ids.tolist(), live)}
+        # An append-only store gives re-enrolled rows a new offset, so the offset versions the user's templates
+        versions = {user_id: int(starts[s]) for user_id, s in zip(ids.tolist(), live)}
+        with self._lock:
+            self._blocks = blocks
+            self._versions = versions
+            self._snapshot = self._publish(ids, matrix, starts, owners, seg_user, live)
+            if self.index is not None:
+                self.index.sync(blocks, versions)
+
+    def train_index(self):
+        """(Re)train the attached ANN index on the current templates and assign every user."""
+        if self.index is None:
+            return False
+        with self._lock:
+            snap = self._snapshot
+            matrix = np.asarray(snap.matrix[snap.seg_user[snap.owners] >= 0], dtype=np.float32)
+            if not self.index.train(matrix):
+                return False
+            self.index.sync(self._blocks, self._versions)
+        return True
+
+    def _use_index(self):
+        return (self.index is not None and self.index.is_trained
+                and len(self._snapshot.ids) >= self.ann_min_users)
+
+    def _build(self, blocks):
+        ids, parts, counts = [], [], []
+        for user_id, rows in blocks:
+            ids.append(user_id)
+            parts.append(rows)
+            counts.append(len(rows))
+        matrix = np.ascontiguousarray(np.vstack(parts) if parts else np.empty((0, self.dim), dtype=self.dtype))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.intp) if counts else np.empty(0, dtype=np.intp)
+        owners = np.repeat(np.arange(len(counts), dtype=np.intp), counts)
+        live = np.arange(len(counts), dtype=np.intp)
+        return self._publish(np.array(ids, dtype=str), matrix, starts, owners, live, live)
+
+    def _publish(self, ids, matrix, starts, owners, seg_user, live):
+        # Readers take the snapshot without locking, so it is replaced as a single tuple
+        sq_norms = np.empty(len(matrix), dtype=np.float32)
+        for lo in range(0, len(matrix), self.block_rows):
+            block = np.asarray(matrix[lo:lo + self.block_rows], dtype=np.float32)
+            sq_norms[lo:lo + len(block)] = np.einsum('ij,ij->i', block, block)
+        # Sorted id lookup lets ANN shortlists map to gallery positions with searchsorted
+        order = np.argsort(ids, kind='stable')
+        return _Snapshot(np.array(ids, dtype=object), matrix, sq_norms, starts, owners,
+                         seg_user, live, (ids[order], order))
+
+    def _scores(self, queries, matrix):
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        # Half-precision storage has no BLAS path, so upcast in bounded blocks
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for lo in range(0, len(matrix), self.block_rows):
+            block = matrix[lo:lo + self.block_rows].astype(np.float32)
+            scores[:, lo:lo + len(block)] = queries @ block.T
+        return scores
+
+    def distances(self, queries):
+        """Return (user ids, per-user min Euclidean distance matrix) for the query rows."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        snap = self._snapshot
+        if len(snap.ids) == 0:
+            return snap.ids, np.empty((len(queries), 0), dtype=np.float32)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        d2 = q_sq[:, None] + snap.sq_norms[None, :] - 2.0 * self._scores(queries, snap.matrix)
+        if len(snap.starts) != len(snap.matrix):
+            d2 = np.minimum.reduceat(d2, snap.starts, axis=1)
+        if len(snap.live) != len(snap.starts):
+            d2 = d2[:, snap.live]
+        return snap.ids, np.sqrt(np.maximum(d2, 0.0))
+
+    def _match_shortlist(self, queries, k, nprobe):
+        snap = self._snapshot
+        sorted_keys, sorted_pos = snap.lookup
+        results = []
+        for query, shortlist in zip(queries, self.index.search(queries, nprobe=nprobe)):
+            slot = np.minimum(np.searchsorted(sorted_keys, shortlist), len(sorted_keys) - 1)
+            found = sorted_keys[slot] == shortlist
+            selected = np.zeros(len(snap.starts), dtype=bool)
+            selected[snap.live[sorted_pos[slot[found]]]] = True
+            if selected.sum() < k:
+                # Too few candidates to judge the runner-up gap; answer exactly
+                results.extend(self._match_exact(query[None, :], k))
+                continue
+            rows = np.flatnonzero(selected[snap.owners])
+            segments = snap.owners[rows]
+            d2 = float(query @ query) + snap.sq_norms[rows] - 2.0 * self._scores(query[None, :], snap.matrix[rows])[0]
+            local_starts = np.flatnonzero(np.r_[True, segments[1:] != segments[:-1]])
+            dist = np.sqrt(np.maximum(np.minimum.reduceat(d2, local_starts), 0.0))
+            users = snap.seg_user[segments[local_starts]]
+            results.append(self._top_k(snap.ids[users], dist[None, :], k)[0])
+        return results
+
+    def _match_exact(self, queries, k):
+        ids, dist = self.distances(queries)
+        return self._top_k(ids, dist, k)
+
+    def match(self, queries, k=2, exact=False, nprobe=None):
+        """Return, for each query row, up to k (distance, user_id) pairs sorted nearest first."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not exact and self._use_index():
+            return self._match_shortlist(queries, k, nprobe)
+        return self._match_exact(queries, k)
+
+    @staticmethod
+    def _top_k(ids, dist, k):
+        n = dist.shape[1]
+        if n == 0:
+            return [[] for _ in range(dist.shape[0])]
+        k = min(k, n)
+        if k < n:
+            top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), (dist.shape[0], n))
+        top_dist = np.take_along_axis(dist, top, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_dist = np.take_along_axis(top_dist, order, axis=1)
+        return [
+            [(float(d), ids[j]) for d, j in zip(row_dist, row_idx)]
+            for row_dist, row_idx in zip(top_dist, top)
+        ]
@@ -0,0 +1,395 @@
+import logging
+
+# Numbered schema migrations. The version applied last is kept in SQLite's
+# PRAGMA user_version; each migration runs once, in its own transaction.
+MIGRATIONS = []
+
+
+def migration(version):
+    def register(fn):
+        if any(v >= version for v, _ in MIGRATIONS):
+            raise ValueError(f"Migration {version} must be numbered after {MIGRATIONS[-1][0]}")
+        MIGRATIONS.append((version, fn))
+        return fn
+    return register
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply every migration newer than the database; returns the versions applied."""
+    applied = []
+    for version, fn in migrations:
+        if schema_version(conn) >= version:
+            continue
+        # IMMEDIATE takes the write lock up front, so two processes starting at once
+        # cannot both run the same migration; re-check the version once it is held
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            fn(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logging.debug(f"Applied schema migration {version}: {fn.__name__}")
+        applied.append(version)
+    return applied
+
+
+def add_column(cursor, table, column, definition):
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+@migration(1)
+def base_schema(cursor):
+    # Databases created before migrations existed went through the same tables and
+    # column additions at startup, so this is safe to run over them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT UNIQUE NOT NULL,
+            role TEXT NOT NULL,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            contact TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            profile_pic TEXT,
+            dataset_folder TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS role_counters (
+            role TEXT PRIMARY KEY,
+            counter INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            status TEXT NOT NULL,
+            confidence REAL,
+            detected_speed REAL,  -- Added detected_speed column
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            UNIQUE(user_id, date)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visitors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            photo_path TEXT NOT NULL,
+            status TEXT DEFAULT 'Visitor',
+            confidence REAL,
+            detected_speed REAL  -- Added detected_speed column
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS geo_fence (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            photo_path TEXT NOT NULL,
+            status TEXT DEFAULT 'Zone Breach',
+            user_id TEXT
+        )
+    ''')
+
+    roles = ['hostelite', 'warden', 'support_staff']
+    for role in roles:
+        cursor.execute('INSERT OR IGNORE INTO role_counters (role, counter) VALUES (?, 0)', (role,))
+
+    add_column(cursor, 'visitors', 'status', 'TEXT DEFAULT "Visitor"')
+    add_column(cursor, 'visitors', 'confidence', 'REAL')
+    add_column(cursor, 'visitors', 'detected_speed', 'REAL')
+    add_column(cursor, 'attendance', 'confidence', 'REAL')
+    add_column(cursor, 'attendance', 'detected_speed', 'REAL')
+
+    # Server-side capture sources (RTSP URLs or video files) and what to run on them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cameras (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            camera_id TEXT UNIQUE NOT NULL,
+            source TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            zone TEXT,
+            fps REAL DEFAULT 1,
+            detector TEXT,
+            enabled INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    add_column(cursor, 'cameras', 'detector', 'TEXT')
+
+    # Per-stage pipeline timings (JSON, milliseconds) recorded with each event
+    for table in ['attendance', 'visitors', 'geo_fence']:
+        add_column(cursor, table, 'stage_timings', 'TEXT')
+
+    # Repeated sightings are folded into one event with a last-seen time and count
+    for table in ['visitors', 'geo_fence']:
+        add_column(cursor, table, 'last_seen', 'TEXT')
+        add_column(cursor, table, 'seen_count', 'INTEGER DEFAULT 1')
+
+
+@migration(2)
+def report_indexes(cursor):
+    # attendance(user_id, date) is already covered by the UNIQUE(user_id, date) constraint's index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date_status ON attendance (date, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_status_timestamp ON visitors (status, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_timestamp ON visitors (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_geo_fence_status_timestamp ON geo_fence (status, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_geo_fence_timestamp ON geo_fence (timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_geo_fence_user_id ON geo_fence (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_user_id ON embeddings (user_id)')
+
+
+# Counts behind /home and /insights, kept current by triggers on the event tables so every
+# writer (the event writer, clear_notifications, manual edits) updates them in its own transaction
+SUMMARY_TABLES = ('daily_stats', 'monthly_stats', 'user_breaches', 'counters')
+
+
+def rebuild_summaries(cursor):
+    """Recompute the summary tables from the event tables."""
+    for table in SUMMARY_TABLES:
+        cursor.execute(f'DELETE FROM {table}')
+    cursor.execute('''
+        INSERT INTO daily_stats (date, present, visitors, breaches)
+        SELECT date, SUM(present), SUM(visitors), SUM(breaches) FROM (
+            SELECT date, COUNT(*) AS present, 0 AS visitors, 0 AS breaches
+            FROM attendance WHERE status = 'Present' GROUP BY date
+            UNION ALL
+            SELECT substr(timestamp, 1, 10), 0, COUNT(*), 0
+            FROM visitors WHERE status = 'Visitor' GROUP BY substr(timestamp, 1, 10)
+            UNION ALL
+            SELECT substr(timestamp, 1, 10), 0, 0, COUNT(*)
+            FROM geo_fence WHERE status = 'Zone Breach' GROUP BY substr(timestamp, 1, 10)
+        ) GROUP BY date
+    ''')
+    cursor.execute('''
+        INSERT INTO monthly_stats (month, present)
+        SELECT substr(date, 1, 7), COUNT(*) FROM attendance WHERE status = 'Present' GROUP BY substr(date, 1, 7)
+    ''')
+    cursor.execute('''
+        INSERT INTO user_breaches (user_id, breaches)
+        SELECT user_id, COUNT(*) FROM geo_fence
+        WHERE status = 'Zone Breach' AND user_id IS NOT NULL GROUP BY user_id
+    ''')
+    cursor.execute('''
+        INSERT INTO counters (name, value)
+        SELECT 'users', COUNT(*) FROM users
+        UNION ALL SELECT 'open_visitors', COUNT(*) FROM visitors WHERE status = 'Visitor'
+        UNION ALL SELECT 'open_breaches', COUNT(*) FROM geo_fence WHERE status = 'Zone Breach'
+    ''')
+
+
+def _count_trigger(cursor, name, event, table, when, statements):
+    row = 'OLD' if event == 'DELETE' else 'NEW'
+    body = ';\n'.join(s.replace('ROW.', f'{row}.') for s in statements)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+        WHEN {when.replace('ROW.', f'{row}.')}
+        BEGIN
+            {body};
+        END
+    ''')
+
+
+def _bump(table, key_column, key, column, delta):
+    return (f'INSERT INTO {table} ({key_column}, {column}) VALUES ({key}, {delta}) '
+            f'ON CONFLICT({key_column}) DO UPDATE SET {column} = {column} + {delta}')
+
+
+@migration(3)
+def summary_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            date TEXT PRIMARY KEY,
+            present INTEGER NOT NULL DEFAULT 0,
+            visitors INTEGER NOT NULL DEFAULT 0,
+            breaches INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_stats (
+            month TEXT PRIMARY KEY,
+            present INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_breaches (
+            user_id TEXT PRIMARY KEY,
+            breaches INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for event, delta in (('INSERT', 1), ('DELETE', -1)):
+        suffix = event.lower()
+        _count_trigger(cursor, f'attendance_summary_{suffix}', event, 'attendance', "ROW.status = 'Present'", [
+            _bump('daily_stats', 'date', 'ROW.date', 'present', delta),
+            _bump('monthly_stats', 'month', 'substr(ROW.date, 1, 7)', 'present', delta),
+        ])
+        _count_trigger(cursor, f'visitors_summary_{suffix}', event, 'visitors', "ROW.status = 'Visitor'", [
+            _bump('daily_stats', 'date', 'substr(ROW.timestamp, 1, 10)', 'visitors', delta),
+            _bump('counters', 'name', "'open_visitors'", 'value', delta),
+        ])
+        _count_trigger(cursor, f'geo_fence_summary_{suffix}', event, 'geo_fence', "ROW.status = 'Zone Breach'", [
+            _bump('daily_stats', 'date', 'substr(ROW.timestamp, 1, 10)', 'breaches', delta),
+            _bump('counters', 'name', "'open_breaches'", 'value', delta),
+        ])
+        _count_trigger(cursor, f'geo_fence_user_summary_{suffix}', event, 'geo_fence',
+                       "ROW.status = 'Zone Breach' AND ROW.user_id IS NOT NULL", [
+            _bump('user_breaches', 'user_id', 'ROW.user_id', 'breaches', delta),
+        ])
+        _count_trigger(cursor, f'users_summary_{suffix}', event, 'users', '1', [
+            _bump('counters', 'name', "'users'", 'value', delta),
+        ])
+    rebuild_summaries(cursor)
+
+
+# Source tables of the events stream: kind, table, and SQL for the row's timestamp, status,
+# user and photo. Event times are stored as integer Unix seconds; the source tables keep
+# local wall-clock strings, which the 'utc' modifier converts.
+EVENT_SOURCES = (
+    ('visitor', 'visitors', 'ROW.timestamp', 'ROW.status', 'NULL', 'ROW.photo_path'),
+    ('breach', 'geo_fence', 'ROW.timestamp', 'ROW.status', 'ROW.user_id', 'ROW.photo_path'),
+    ('attendance', 'attendance', "ROW.date || ' ' || ROW.time", 'ROW.status', 'ROW.user_id', 'NULL'),
+)
+
+
+def _event_values(kind, timestamp, status, user_id, photo_path, row):
+    # A timestamp SQLite cannot parse must not block the insert into the source table
+    return (f"'{kind}', {row}.id, CAST(COALESCE(strftime('%s', {timestamp.replace('ROW.', row + '.')}, 'utc'), "
+            f"strftime('%s', 'now')) AS INTEGER), "
+            f"{status.replace('ROW.', row + '.')}, {user_id.replace('ROW.', row + '.')}, "
+            f"{photo_path.replace('ROW.', row + '.')}")
+
+
+@migration(4)
+def events_stream(cursor):
+    # One row per visitor, breach and attendance record, so merged and limited feeds are a single
+    # indexed query. Triggers keep it in step with the source tables in the writer's transaction.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            status TEXT,
+            user_id TEXT,
+            photo_path TEXT,
+            UNIQUE(kind, source_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_kind_ts ON events (kind, ts)')
+    # Alerts (everything but attendance) merged in time order, for /home and the notifications feed
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_alerts_ts ON events (ts) WHERE kind != 'attendance'")
+    for kind, table, timestamp, status, user_id, photo_path in EVENT_SOURCES:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_events_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO events (kind, source_id, ts, status, user_id, photo_path)
+                VALUES ({_event_values(kind, timestamp, status, user_id, photo_path, 'NEW')});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_events_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM events WHERE kind = '{kind}' AND source_id = OLD.id;
+            END
+        ''')
+    # Existing history, oldest first so event ids follow time
+    cursor.execute('DELETE FROM events')
+    backfill = ' UNION ALL '.join(
+        f"SELECT {_event_values(kind, timestamp, status, user_id, photo_path, table)} FROM {table}"
+        for kind, table, timestamp, status, user_id, photo_path in EVENT_SOURCES
+    )
+    cursor.execute(f'''
+        INSERT INTO events (kind, source_id, ts, status, user_id, photo_path)
+        SELECT * FROM ({backfill}) ORDER BY 3, 1, 2
+    ''')
+
+
+# Tables whose writes change what the report views return; each has a row in data_versions
+VERSIONED_TABLES = ('users', 'attendance', 'visitors', 'geo_fence')
+
+
+def data_version(conn, tables):
+    """Current version of each of tables, in order; a view's output can only change when one of them does."""
+    versions = dict(conn.execute(f"SELECT name, version FROM data_versions WHERE name IN ({', '.join('?' * len(tables))})",
+                                 tuple(tables)).fetchall())
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+@migration(5)
+def data_version_counters(cursor):
+    # Bumped by triggers in the writing transaction, whichever process or code path writes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        cursor.execute('INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            _count_trigger(cursor, f'{table}_version_{event.lower()}', event, table, '1', [
+                f"UPDATE data_versions SET version = version + 1 WHERE name = '{table}'",
+            ])
+
+
+@migration(6)
+def event_photo_updates(cursor):
+    # A coalesced sighting can point its row at a better photo; the events row follows it
+    for kind, table, _, _, _, photo_path in EVENT_SOURCES:
+        if photo_path == 'NULL':
+            continue
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_events_photo AFTER UPDATE OF photo_path ON {table}
+            WHEN NEW.photo_path IS NOT OLD.photo_path
+            BEGIN
+                UPDATE events SET photo_path = {photo_path.replace('ROW.', 'NEW.')}
+                WHERE kind = '{kind}' AND source_id = NEW.id;
+            END
+        ''')
+
+
+# Columns of the event tables that the versioned views render. Coalesced repeat sightings
+# only touch last_seen and seen_count, which must not invalidate cached pages on every frame.
+VERSIONED_COLUMNS = {
+    'visitors': ('timestamp', 'photo_path', 'status', 'confidence', 'detected_speed'),
+    'geo_fence': ('timestamp', 'photo_path', 'status', 'user_id'),
+}
+
+
+@migration(7)
+def versioned_columns(cursor):
+    for table, columns in VERSIONED_COLUMNS.items():
+        cursor.execute(f'DROP TRIGGER IF EXISTS {table}_version_update')
+        # UPDATE OF fires whenever a column is assigned, so also require that one actually changed
+        _count_trigger(cursor, f'{table}_version_update', f"UPDATE OF {', '.join(columns)}", table,
+                       ' OR '.join(f'ROW.{c} IS NOT OLD.{c}' for c in columns), [
+                           f"UPDATE data_versions SET version = version + 1 WHERE name = '{table}'",
+                       ])
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+import numpy as np
+
+COLD = 'cold'
+LOADING = 'loading'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+def build_facenet():
+    from keras_facenet import FaceNet
+    return FaceNet()
+
+
+def build_mtcnn():
+    from mtcnn import MTCNN
+    return MTCNN()
+
+
+class ModelRegistry:
+    """Builds the face models on first use and tracks warm-up state.
+
+    Importing TensorFlow and tracing the graphs takes several seconds, so nothing
+    is constructed at import time. start_warmup() loads both models and runs a
+    dummy batch of representative sizes on a background thread; until that
+    finishes, ready is False and recognition routes can answer "warming up".
+    """
+
+    def __init__(self, embedder_factory=build_facenet, detector_factory=build_mtcnn,
+                 frame_sizes=((480, 640), (720, 1280)), batch_sizes=(1, 4)):
+        self._embedder_factory = embedder_factory
+        self._detector_factory = detector_factory
+        self.frame_sizes = frame_sizes
+        self.batch_sizes = batch_sizes
+        self._lock = threading.Lock()
+        self._embedder = None
+        self._detector = None
+        self._thread = None
+        self.state = COLD
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = self._embedder_factory()
+        return self._embedder
+
+    @property
+    def detector(self):
+        if self._detector is None:
+            with self._lock:
+                if self._detector is None:
+                    self._detector = self._detector_factory()
+        return self._detector
+
+    def warm_up(self):
+        try:
+            self.state = LOADING
+            start = time.time()
+            embedder, detector = self.embedder, self.detector
+            self.load_seconds = time.time() - start
+            self.state = WARMING
+            start = time.time()
+            for height, width in self.frame_sizes:
+                detector.detect_faces(np.zeros((height, width, 3), dtype=np.uint8))
+            for batch in self.batch_sizes:
+                embedder.embeddings(np.zeros((batch, 160, 160, 3), dtype=np.uint8))
+            self.warmup_seconds = time.time() - start
+            self.state = READY
+            logging.debug(f"Models loaded in {self.load_seconds:.2f}s, warmed up in {self.warmup_seconds:.2f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            logging.error(f"Model warm-up failed: {str(e)}")
+
+    def start_warmup(self):
+        """Start loading and warming the models in the background; safe to call repeatedly."""
+        if self._thread is not None:
+            return self._thread
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.warm_up, name='model-warmup', daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def status(self):
+        return {
+            'state': self.state,
+            'ready': self.ready,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'error': self.error,
+        }
@@ -0,0 +1,118 @@
+import threading
+import time
+import cv2
+
+
+def merge_rects(rects):
+    """Union overlapping (x, y, w, h) rectangles until none overlap."""
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                ax, ay, aw, ah = rects[i]
+                bx, by, bw, bh = rects[j]
+                if ax <= bx + bw and bx <= ax + aw and ay <= by + bh and by <= ay + ah:
+                    x, y = min(ax, bx), min(ay, by)
+                    rects[i] = [x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(r) for r in rects]
+
+
+class MotionGate:
+    """Cheap change detector for one camera, run before the face detector.
+
+    Each frame is shrunk to `width` pixels wide, blurred, and differenced
+    against the previous frame. check() returns None when fewer than
+    min_area (fraction of the frame) pixels changed by more than threshold,
+    otherwise the padded bounding boxes of the changed areas in full-frame
+    coordinates. An empty list means "look at the whole frame": the first
+    frame, a large change, or max_idle_seconds since the last detection.
+    """
+
+    def __init__(self, width=160, threshold=25, min_area=0.002, padding=0.25, full_frame_area=0.5,
+                 max_idle_seconds=10):
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.padding = padding
+        self.full_frame_area = full_frame_area
+        self.max_idle = max_idle_seconds
+        self._lock = threading.Lock()
+        self.previous = None
+        self.last_detect = 0.0
+        self.last_used = time.time()
+
+    def check(self, img_rgb):
+        height, width = img_rgb.shape[:2]
+        scale = min(1.0, self.width / width)
+        small = cv2.resize(img_rgb, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+        now = time.time()
+        with self._lock:
+            self.last_used = now
+            previous, self.previous = self.previous, gray
+            if previous is None or previous.shape != gray.shape or now - self.last_detect >= self.max_idle:
+                self.last_detect = now
+                return []
+        _, mask = cv2.threshold(cv2.absdiff(previous, gray), self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, None, iterations=2)
+        if cv2.countNonZero(mask) < self.min_area * mask.size:
+            return None
+        self.last_detect = now
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        rects = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            x, y, w, h = x / scale, y / scale, w / scale, h / scale
+            # Changed pixels are often just the edges of a moving head; pad so the whole face is inside
+            pad = self.padding * max(w, h)
+            x0, y0 = max(0, int(x - pad)), max(0, int(y - pad))
+            x1, y1 = min(width, int(x + w + pad)), min(height, int(y + h + pad))
+            rects.append((x0, y0, x1 - x0, y1 - y0))
+        rects = merge_rects(rects)
+        if sum(w * h for _, _, w, h in rects) >= self.full_frame_area * width * height:
+            return []
+        return rects
+
+
+class MotionGates:
+    """One MotionGate per (route, camera) session, with counters across all of them."""
+
+    def __init__(self, idle_seconds=600, **gate_options):
+        self.idle = idle_seconds
+        self.gate_options = gate_options
+        self._lock = threading.Lock()
+        self._gates = {}
+        self.stats = {'frames': 0, 'skipped': 0, 'full_frame': 0, 'regions': 0}
+
+    def check(self, key, img_rgb):
+        now = time.time()
+        with self._lock:
+            for stale_key in [k for k, g in self._gates.items() if now - g.last_used > self.idle]:
+                del self._gates[stale_key]
+            gate = self._gates.get(key)
+            if gate is None:
+                gate = self._gates[key] = MotionGate(**self.gate_options)
+        regions = gate.check(img_rgb)
+        with self._lock:
+            self.stats['frames'] += 1
+            if regions is None:
+                self.stats['skipped'] += 1
+            elif regions:
+                self.stats['regions'] += 1
+            else:
+                self.stats['full_frame'] += 1
+        return regions
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats, sessions=len(self._gates))
+        stats['skip_ratio'] = round(stats['skipped'] / stats['frames'], 3) if stats['frames'] else 0
+        return stats
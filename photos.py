@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+THUMBNAIL_DIR = 'thumbs'
+
+
+def thumbnail_path(photo_path):
+    """Where the thumbnail of photo_path lives: a thumbs/ folder next to it."""
+    if not photo_path:
+        return photo_path
+    # Stored paths double as URLs, so they use forward slashes on every platform
+    folder, name = posixpath.split(photo_path.replace('\\', '/'))
+    return posixpath.join(folder, THUMBNAIL_DIR, name)
+
+
+class StoredPhoto:
+    """A photo handed to the store: its paths now, and a future resolved once both files are on disk."""
+
+    def __init__(self, path, future, duplicate=False):
+        self.path = path
+        self.thumb_path = thumbnail_path(path)
+        self.future = future
+        self.duplicate = duplicate
+
+    def wait(self, timeout=None):
+        """Block until the files are written; returns False if writing failed or timed out."""
+        try:
+            self.future.result(timeout=timeout)
+            return True
+        except Exception as e:
+            logging.warning(f"Photo {self.path} not written: {str(e)}")
+            return False
+
+
+class PhotoStore:
+    """Evidence photos sharded into root/YYYY/MM/DD, each with a small thumbnail for list views.
+
+    save() decides the path up front and queues the encoding and writing on
+    a single background thread, so the request only pays for a copy and a
+    hash of the crop. The file name is that hash, so an identical crop on the
+    same day maps to the file already there (or already queued) and is not
+    written twice; since rows may share a file, it is never rewritten. Files
+    are written to a temporary name and renamed, so a page or alert never
+    reads half a JPEG.
+    """
+
+    def __init__(self, root, quality=85, thumb_size=160, thumb_quality=70, max_pending=500):
+        self.root = root
+        self.quality = quality
+        self.thumb_size = thumb_size
+        self.thumb_quality = thumb_quality
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='photo-store')
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.stats = {'saved': 0, 'deduplicated': 0, 'failed': 0, 'sync_writes': 0,
+                      'bytes': 0, 'thumb_bytes': 0, 'write_total': 0.0}
+
+    def shard(self, when=None):
+        return posixpath.join(self.root, (when or datetime.now()).strftime('%Y/%m/%d'))
+
+    @staticmethod
+    def content_hash(crop):
+        digest = hashlib.sha1(str(crop.shape).encode())
+        digest.update(crop.tobytes())
+        return digest.hexdigest()[:20]
+
+    def save(self, crop, prefix, when=None):
+        """Store a face crop; returns a StoredPhoto whose path can go into the database right away."""
+        # The crop is usually a view into the frame, which later stages may draw on
+        crop = np.ascontiguousarray(crop).copy()
+        path = posixpath.join(self.shard(when), f"{prefix}_{self.content_hash(crop)}.jpg")
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is None and os.path.exists(path):
+                pending = Future()
+                pending.set_result(path)
+            if pending is not None:
+                self.stats['deduplicated'] += 1
+                return StoredPhoto(path, pending, duplicate=True)
+            future = self._reserve(path)
+        self._submit(path, crop, future)
+        return StoredPhoto(path, future)
+
+    def _reserve(self, path):
+        # Caller holds the lock; a save of the same crop from now on shares this future
+        future = Future()
+        self._pending[path] = future
+        future.add_done_callback(lambda f: self._done(path, f))
+        return future
+
+    def _done(self, path, future):
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    def _submit(self, path, crop, future):
+        with self._lock:
+            backlog = len(self._pending)
+            if backlog > self.max_pending:
+                self.stats['sync_writes'] += 1
+        if backlog > self.max_pending:
+            # Writing in the caller is slower for it, but keeps memory bounded when the disk falls behind
+            self._run(path, crop, future)
+        else:
+            self._executor.submit(self._run, path, crop, future)
+
+    def _run(self, path, crop, future):
+        try:
+            future.set_result(self._write(path, crop))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _encode(self, img, quality):
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buf.tobytes()
+
+    def _thumbnail(self, crop):
+        h, w = crop.shape[:2]
+        scale = self.thumb_size / max(h, w)
+        if scale >= 1:
+            return crop
+        return cv2.resize(crop, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    def _put(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _write(self, path, crop):
+        started = time.time()
+        try:
+            photo = self._encode(crop, self.quality)
+            thumb = self._encode(self._thumbnail(crop), self.thumb_quality)
+            # Thumbnail first: once the photo exists, list views may ask for either
+            self._put(thumbnail_path(path), thumb)
+            self._put(path, photo)
+        except Exception as e:
+            with self._lock:
+                self.stats['failed'] += 1
+            logging.error(f"Failed to write photo {path}: {str(e)}")
+            raise
+        with self._lock:
+            self.stats['saved'] += 1
+            self.stats['bytes'] += len(photo)
+            self.stats['thumb_bytes'] += len(thumb)
+            self.stats['write_total'] += time.time() - started
+        return path
+
+    def make_thumbnail(self, path):
+        """Write the thumbnail for an existing photo; returns False if the photo cannot be read."""
+        img = cv2.imread(path)
+        if img is None:
+            return False
+        self._put(thumbnail_path(path), self._encode(self._thumbnail(img), self.thumb_quality))
+        return True
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            pending = len(self._pending)
+        written = stats.pop('saved')
+        write_total = stats.pop('write_total')
+        return dict(stats, saved=written, pending=pending, quality=self.quality, thumb_size=self.thumb_size,
+                    avg_photo_kib=round(stats['bytes'] / written / 1024, 1) if written else 0,
+                    avg_thumb_kib=round(stats['thumb_bytes'] / written / 1024, 1) if written else 0,
+                    avg_write_ms=round(1000 * write_total / written, 2) if written else 0)
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+import traceback
+
+STAGES = ('decode', 'detect', 'filter', 'crop', 'embed', 'match', 'policy', 'persist', 'alert')
+
+
+class StopFrame(Exception):
+    """Raised by a stage to end processing early with a response (no faces, no motion, bad input)."""
+
+    def __init__(self, payload, status=200):
+        super().__init__(payload.get('message'))
+        self.payload = payload
+        self.status = status
+
+
+class FrameContext:
+    """Everything the stages know about one frame; each stage reads earlier fields and fills its own."""
+
+    def __init__(self, mode, frame, camera_id='default', **options):
+        self.mode = mode
+        self.frame = frame
+        self.camera_id = camera_id
+        self.session_key = (mode, camera_id)
+        self.options = options
+        self.img = None
+        self.img_rgb = None
+        self.faces = []
+        self.boxes = []
+        self.assignments = []
+        self.fresh = []
+        self.crops = None
+        self.fresh_embeddings = None
+        self.embeddings = None
+        self.matches = []
+        self.skipped = 0
+        self.messages = []
+        self.results = []
+        self.writes = []
+        self.alerts = []
+        self.timings = {}
+        self.conn = None
+
+    def timings_ms(self):
+        return {stage: round(seconds * 1000, 2) for stage, seconds in self.timings.items()}
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Pipeline:
+    """Runs a frame through named stages in STAGES order, timing each one.
+
+    stages maps stage names to callables taking the FrameContext; stages a
+    route does not need are simply left out. respond builds the JSON payload
+    once every stage has run. Timings are returned with the response under
+    'timings_ms' and aggregated per stage for metrics().
+    """
+
+    def __init__(self, name, stages, respond):
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.stages = [(stage, stages[stage]) for stage in STAGES if stage in stages]
+        self.respond = respond
+        self._lock = threading.Lock()
+        self._stats = {stage: [0, 0.0, 0.0] for stage, _ in self.stages}  # count, total, max
+        self._frames = {'frames': 0, 'stopped': 0, 'errors': 0}
+
+    def run(self, ctx):
+        """Process one frame; returns (response payload, HTTP status)."""
+        outcome = 'frames'
+        stage = None
+        try:
+            for stage, fn in self.stages:
+                started = time.perf_counter()
+                try:
+                    fn(ctx)
+                finally:
+                    ctx.timings[stage] = time.perf_counter() - started
+            payload, status = self.respond(ctx), 200
+        except StopFrame as stop:
+            outcome = 'stopped'
+            payload, status = dict(stop.payload), stop.status
+        except Exception as e:
+            outcome = 'errors'
+            logging.error(f"Error in {self.name} pipeline at {stage} stage: {str(e)}\n{traceback.format_exc()}")
+            payload, status = {"status": "error", "message": str(e)}, 500
+        finally:
+            ctx.close()
+        payload['timings_ms'] = ctx.timings_ms()
+        self._record(ctx.timings, outcome)
+        return payload, status
+
+    def _record(self, timings, outcome):
+        with self._lock:
+            self._frames['frames'] += 1
+            if outcome != 'frames':
+                self._frames[outcome] += 1
+            for stage, seconds in timings.items():
+                stats = self._stats[stage]
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def metrics(self):
+        with self._lock:
+            report = dict(self._frames)
+            report['stages'] = {
+                stage: {
+                    'runs': count,
+                    'avg_ms': round(1000 * total / count, 2) if count else 0,
+                    'max_ms': round(1000 * peak, 2),
+                }
+                for stage, (count, total, peak) in self._stats.items()
+            }
+        return report
@@ -0,0 +1,59 @@
+import threading
+
+
+class DailyPresence:
+    """Which users already have an attendance row for the current day, kept in memory.
+
+    The set is loaded from the database on first use each day through
+    loader(date), an iterable of user ids, and starts over when a call names a
+    new date, so it rolls over at midnight without a timer. claim() is the
+    check-and-mark step: only the first caller for a user and date gets True
+    and goes on to insert the row. release() gives a claim back if that insert
+    fails. Other processes writing the same database are not seen here; the
+    UNIQUE(user_id, date) constraint with INSERT OR IGNORE covers them.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._date = None
+        self._present = set()
+        self.stats = {'hits': 0, 'claims': 0, 'loads': 0, 'released': 0}
+
+    def _ensure(self, date):
+        # Caller holds the lock; loading once per day keeps the database off the hot path
+        if date != self._date:
+            self._present = set(self.loader(date))
+            self._date = date
+            self.stats['loads'] += 1
+
+    def is_present(self, user_id, date):
+        with self._lock:
+            self._ensure(date)
+            return user_id in self._present
+
+    def claim(self, user_id, date):
+        with self._lock:
+            self._ensure(date)
+            if user_id in self._present:
+                self.stats['hits'] += 1
+                return False
+            self._present.add(user_id)
+            self.stats['claims'] += 1
+            return True
+
+    def release(self, user_id, date):
+        with self._lock:
+            if date == self._date and user_id in self._present:
+                self._present.discard(user_id)
+                self.stats['released'] += 1
+
+    def invalidate(self):
+        """Forget the cached day; the next call reloads it from the database."""
+        with self._lock:
+            self._date = None
+            self._present = set()
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, date=self._date, present=len(self._present))
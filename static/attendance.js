@@ -4,8 +4,15 @@ document.addEventListener('DOMContentLoaded', function() {
     const startBtn = document.getElementById('startAttendance');
     const statusDiv = document.getElementById('attendanceStatus');
     const presentTable = document.getElementById('presentTable');
+    const absentTable = document.getElementById('absentTable');
     let stream;
     let intervalId;
+    let frameStream = null;
+    let lastTableUpdate = 0;
+    const STREAM_INTERVAL_MS = 500;
+    const POST_INTERVAL_MS = 5000;
+    // Identifies this tab as one camera so repeat sightings are coalesced per camera
+    const cameraId = 'tab-' + Math.random().toString(36).slice(2, 10);
 
     // Validate critical elements
     if (!video) {
@@ -59,6 +66,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 const parser = new DOMParser();
                 const doc = parser.parseFromString(html, 'text/html');
                 const newTableBody = doc.querySelector('#presentTable tbody');
+                const newAbsentBody = doc.querySelector('#absentTable tbody');
+                if (absentTable && newAbsentBody) {
+                    absentTable.querySelector('tbody').innerHTML = newAbsentBody.innerHTML;
+                }
                 if (newTableBody) {
                     const tbody = presentTable.querySelector('tbody');
                     if (tbody) {
@@ -79,6 +90,30 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // A pushed attendance event moves the user from the absent table to the top of the present one
+    function showAttendance(event) {
+        const tbody = presentTable.querySelector('tbody');
+        const shownDate = tbody.querySelector('tr td:nth-child(3)') || (absentTable && absentTable.querySelector('tbody tr td:nth-child(3)'));
+        if (shownDate && shownDate.textContent.trim() !== event.date) {
+            // The day has rolled over since the page was loaded
+            updateAttendanceTable();
+            return;
+        }
+        const alreadyShown = Array.from(tbody.rows).some(row => row.cells[0].textContent.trim() === event.user_id);
+        if (!alreadyShown) {
+            const row = tbody.insertRow(0);
+            row.innerHTML = `<td>${escapeHtml(event.user_id)}</td><td>${escapeHtml(event.name)}</td>` +
+                `<td>${escapeHtml(event.date)}</td><td>${escapeHtml(event.time)}</td><td>${escapeHtml(event.status)}</td>`;
+        }
+        if (absentTable) {
+            Array.from(absentTable.querySelector('tbody').rows)
+                .filter(row => row.cells[0].textContent.trim() === event.user_id)
+                .forEach(row => row.remove());
+        }
+    }
+
+    const live = subscribeLiveEvents({ attendance: showAttendance }, { onOpen: updateAttendanceTable });
+
     startBtn.addEventListener('click', function() {
         console.log('Start Attendance button clicked');
         if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
@@ -140,6 +175,10 @@ document.addEventListener('DOMContentLoaded', function() {
         stopBtn.addEventListener('click', () => {
             console.log('Stop Attendance button clicked');
             clearInterval(intervalId);
+            if (frameStream) {
+                frameStream.close();
+                frameStream = null;
+            }
             if (stream) {
                 stream.getTracks().forEach(track => track.stop());
                 video.srcObject = null;
@@ -153,6 +192,44 @@ document.addEventListener('DOMContentLoaded', function() {
         console.error('Stop Attendance button not found');
     }
 
+    function showResult(data) {
+        console.log('Attendance response:', data);
+        const statusClass = data.status === 'success' ? 'text-success' : data.status === 'warming_up' ? 'text-info' : 'text-danger';
+        statusDiv.innerHTML = data.message
+            .split('; ')
+            .map(msg => `<div class="${statusClass}">${msg}</div>`)
+            .join('');
+        // New rows are pushed over live events; without them, refresh the table at most every 5 seconds
+        if (!live.connected && data.status === 'success' && Date.now() - lastTableUpdate >= POST_INTERVAL_MS) {
+            lastTableUpdate = Date.now();
+            updateAttendanceTable();
+        }
+    }
+
+    function postFrame(blob) {
+        const formData = new FormData();
+        formData.append('image', blob, 'frame.jpg');
+        formData.append('camera_id', cameraId);
+
+        console.log('Sending image to /process_attendance');
+        fetch('/process_attendance', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => {
+            // 503 carries a JSON "warming_up" status while the models load
+            if (!response.ok && response.status !== 503) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(showResult)
+        .catch(err => {
+            console.error('Process attendance error:', err);
+            statusDiv.innerHTML = `<div class="text-danger">Error: ${err.message}</div>`;
+        });
+    }
+
     function processAttendance() {
         console.log('Starting attendance processing...');
         const canvas = document.createElement('canvas');
@@ -160,45 +237,35 @@ document.addEventListener('DOMContentLoaded', function() {
         canvas.height = video.videoHeight || 480;
         const ctx = canvas.getContext('2d');
 
-        intervalId = setInterval(() => {
-            ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-            canvas.toBlob(blob => {
-                const formData = new FormData();
-                formData.append('image', blob, 'frame.jpg');
-
-                console.log('Sending image to /process_attendance');
-                fetch('/process_attendance', {
-                    method: 'POST',
-                    body: formData
-                })
-                .then(response => {
-                    if (!response.ok) {
-                        throw new Error(`HTTP error! Status: ${response.status}`);
-                    }
-                    return response.json();
-                })
-                .then(data => {
-                    console.log('Attendance response:', data);
-                    const statusClass = data.status === 'success' ? 'text-success' : 'text-danger';
-                    statusDiv.innerHTML = data.message
-                        .split('; ')
-                        .map(msg => `<div class="${statusClass}">${msg}</div>`)
-                        .join('');
-                    if (data.status === 'success') {
-                        updateAttendanceTable();
-                    }
-                })
-                .catch(err => {
-                    console.error('Process attendance error:', err);
-                    statusDiv.innerHTML = `<div class="text-danger">Error: ${err.message}</div>`;
-                });
-            }, 'image/jpeg', 0.9);
-        }, 5000);
+        function captureEvery(interval, send) {
+            clearInterval(intervalId);
+            intervalId = setInterval(() => {
+                ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+                canvas.toBlob(send, 'image/jpeg', 0.9);
+            }, interval);
+        }
+
+        function fallBackToPosts() {
+            frameStream = null;
+            if (video.srcObject) {
+                console.warn('Frame stream unavailable, sending frames as POST requests');
+                captureEvery(POST_INTERVAL_MS, postFrame);
+            }
+        }
+
+        frameStream = openFrameStream('attendance', cameraId, {
+            onOpen: () => captureEvery(STREAM_INTERVAL_MS, blob => frameStream && frameStream.send(blob)),
+            onResult: showResult,
+            onUnavailable: fallBackToPosts,
+            onClose: fallBackToPosts
+        });
     }
 
-    // Periodically refresh table every 30 seconds
-    setInterval(updateAttendanceTable, 30000);
+    // Refresh the table every 30 seconds only while live events are unavailable
+    setInterval(() => {
+        if (!live.connected) updateAttendanceTable();
+    }, 30000);
 
     // Initial table load
-    updateAttendanceTable();
+    if (!live.source) updateAttendanceTable();
 });
\ No newline at end of file
@@ -0,0 +1,121 @@
+// Escapes a value for use in element text or a quoted attribute of markup built as a string.
+// Feed rows carry user-entered values (user ids come from registration), so renderRow
+// functions pass every interpolated field through this.
+function escapeHtml(value) {
+    return String(value == null ? '' : value)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+// Fills an event table from /events/<feed> instead of re-rendering the whole page.
+// The first call loads the newest page; pollNewer() then fetches only rows committed since
+// the last poll and puts them on top, and loadOlder() appends the next page back in time.
+// renderRow(event) returns the <tr> markup for one event, with every value escaped. A pollNewer() call that arrives while
+// one is running (e.g. from a pushed live event) runs again once it finishes.
+function attachEventFeed(feed, tbody, renderRow, options = {}) {
+    const emptyText = options.emptyText || 'No events yet.';
+    const columns = options.columns || 1;
+    const loadOlderButton = options.loadOlderButton || null;
+    let since = null;
+    let next = null;
+    let polling = false;
+    let pollAgain = false;
+
+    function rowsFor(events) {
+        const holder = document.createElement('tbody');
+        holder.innerHTML = events.map(renderRow).join('');
+        return Array.from(holder.children);
+    }
+
+    function showEmpty() {
+        if (!tbody.children.length) {
+            tbody.innerHTML = `<tr class="feed-empty"><td colspan="${columns}" class="text-center">${emptyText}</td></tr>`;
+        }
+    }
+
+    function clearEmpty() {
+        const placeholder = tbody.querySelector('.feed-empty');
+        if (placeholder) placeholder.remove();
+    }
+
+    function setNext(cursor) {
+        next = cursor;
+        if (loadOlderButton) loadOlderButton.style.display = next ? '' : 'none';
+    }
+
+    async function getJson(params) {
+        const response = await fetch(`/events/${feed}?${new URLSearchParams(params)}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        return response.json();
+    }
+
+    async function loadFirstPage() {
+        const data = await getJson({});
+        since = data.since;
+        tbody.innerHTML = '';
+        rowsFor(data.events).forEach(row => tbody.appendChild(row));
+        setNext(data.next);
+        showEmpty();
+        if (options.onRows) options.onRows();
+    }
+
+    async function pollNewer() {
+        if (polling) {
+            pollAgain = true;
+            return;
+        }
+        polling = true;
+        try {
+            if (since === null) {
+                await loadFirstPage();
+                return;
+            }
+            let more = true;
+            while (more) {
+                const data = await getJson({ since });
+                since = data.since;
+                more = data.more;
+                if (data.events.length) {
+                    clearEmpty();
+                    // Events arrive newest first; prepend from the oldest so the newest ends up on top
+                    rowsFor(data.events).reverse().forEach(row => tbody.prepend(row));
+                    if (options.onRows) options.onRows();
+                }
+            }
+        } catch (err) {
+            console.error(`Error polling ${feed} events:`, err);
+            if (options.onError) options.onError(err);
+        } finally {
+            polling = false;
+            if (pollAgain) {
+                pollAgain = false;
+                pollNewer();
+            }
+        }
+    }
+
+    async function loadOlder() {
+        if (!next) return;
+        try {
+            const data = await getJson({ before: next });
+            rowsFor(data.events).forEach(row => tbody.appendChild(row));
+            setNext(data.next);
+            if (options.onRows) options.onRows();
+        } catch (err) {
+            console.error(`Error loading older ${feed} events:`, err);
+            if (options.onError) options.onError(err);
+        }
+    }
+
+    if (loadOlderButton) {
+        loadOlderButton.style.display = 'none';
+        loadOlderButton.addEventListener('click', loadOlder);
+    }
+    pollNewer();
+    return { pollNewer, loadOlder };
+}
@@ -0,0 +1,59 @@
+// Sends camera frames over one long-lived WebSocket per camera instead of a multipart POST per frame.
+// Each binary message is a 4-byte big-endian length followed by the JPEG bytes; the server answers
+// every processed frame with the same JSON the /process_* routes return and drops frames it
+// could not get to, so callers can send as often as they like.
+function openFrameStream(mode, cameraId, handlers) {
+    if (!('WebSocket' in window)) {
+        handlers.onUnavailable(new Error('WebSocket not supported'));
+        return null;
+    }
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const url = `${protocol}//${window.location.host}/stream/${mode}?camera_id=${encodeURIComponent(cameraId)}`;
+    const ws = new WebSocket(url);
+    ws.binaryType = 'arraybuffer';
+    let opened = false;
+    let closedByUs = false;
+
+    ws.onopen = () => {
+        opened = true;
+        console.log(`Frame stream opened for ${mode}`);
+        if (handlers.onOpen) handlers.onOpen();
+    };
+    ws.onmessage = event => {
+        try {
+            handlers.onResult(JSON.parse(event.data));
+        } catch (err) {
+            console.error('Invalid frame stream message:', err);
+        }
+    };
+    ws.onclose = () => {
+        if (closedByUs) return;
+        if (!opened) {
+            handlers.onUnavailable(new Error('Frame stream endpoint not available'));
+        } else if (handlers.onClose) {
+            handlers.onClose();
+        }
+    };
+
+    return {
+        send(blob) {
+            // Skip this frame while earlier ones are still leaving the socket
+            if (ws.readyState !== WebSocket.OPEN || ws.bufferedAmount > 0) {
+                return false;
+            }
+            blob.arrayBuffer().then(buffer => {
+                const frame = new Uint8Array(4 + buffer.byteLength);
+                new DataView(frame.buffer).setUint32(0, buffer.byteLength);
+                frame.set(new Uint8Array(buffer), 4);
+                if (ws.readyState === WebSocket.OPEN) {
+                    ws.send(frame);
+                }
+            });
+            return true;
+        },
+        close() {
+            closedByUs = true;
+            ws.close();
+        }
+    };
+}
@@ -6,6 +6,12 @@ document.addEventListener('DOMContentLoaded', function() {
     const visitorTable = document.getElementById('visitorTable');
     let stream;
     let intervalId;
+    let frameStream = null;
+    let lastTableUpdate = 0;
+    const STREAM_INTERVAL_MS = 500;
+    const POST_INTERVAL_MS = 8000;
+    // Identifies this tab as one camera so repeat sightings are coalesced per camera
+    const cameraId = 'tab-' + Math.random().toString(36).slice(2, 10);
     let lastDebugImage = null;
 
 
@@ -42,45 +48,32 @@ document.addEventListener('DOMContentLoaded', function() {
         statusDiv.innerHTML = '<div class="text-danger">Error: Video element is hidden</div>';
     }
 
-    // Fetch and update visitor table
-    function updateVisitorTable() {
-        console.log('Updating visitor table...');
-        if (!visitorTable) {
-            console.error('Visitor table not found during update');
-            statusDiv.innerHTML = '<div class="text-danger">Error: Visitor table not found</div>';
-            return;
+    // Visitor rows come from /events/visitors; updates only pull events newer than the last one shown.
+    // Rows show the thumbnail and link to the full photo; older photos without one fall back to the original
+    const visitorFeed = attachEventFeed('visitors', visitorTable.querySelector('tbody'), entry => `
+        <tr>
+            <td><a href="${escapeHtml(entry.photo)}" target="_blank"><img src="${escapeHtml(entry.thumb)}" alt="Visitor Photo"
+                loading="lazy" style="width: 100px; height: auto;" data-full="${escapeHtml(entry.photo)}"
+                onerror="this.onerror=null; this.src=this.dataset.full"></a></td>
+            <td>${escapeHtml(entry.date)}</td>
+            <td>${escapeHtml(entry.time)}</td>
+            <td>${escapeHtml(entry.status)}</td>
+        </tr>`, {
+        columns: 4,
+        emptyText: 'No visitors recorded.',
+        loadOlderButton: document.getElementById('loadOlderVisitors'),
+        onError: err => {
+            statusDiv.innerHTML = `<div class="text-danger">Error updating table: ${err.message}</div>`;
         }
-        fetch('/intrusion-monitor')
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`HTTP error! Status: ${response.status}`);
-                }
-                return response.text();
-            })
-            .then(html => {
-                const parser = new DOMParser();
-                const doc = parser.parseFromString(html, 'text/html');
-                const newTableBody = doc.querySelector('#visitorTable tbody');
-                if (newTableBody) {
-                    const tbody = visitorTable.querySelector('tbody');
-                    if (tbody) {
-                        tbody.innerHTML = newTableBody.innerHTML;
-                        console.log('Visitor table updated successfully');
-                    } else {
-                        console.error('Table body not found in visitorTable');
-                        statusDiv.innerHTML = '<div class="text-danger">Error: Table body not found</div>';
-                    }
-                } else {
-                    console.error('Table body not found in response HTML');
-                    statusDiv.innerHTML = '<div class="text-danger">Error: Table body not found in response</div>';
-                }
-            })
-            .catch(err => {
-                console.error('Error updating visitor table:', err);
-                statusDiv.innerHTML = `<div class="text-danger">Error updating table: ${err.message}</div>`;
-            });
+    });
+
+    function updateVisitorTable() {
+        visitorFeed.pollNewer();
     }
 
+    // Each committed visitor is pushed; the feed then fetches just the rows after its cursor
+    const live = subscribeLiveEvents({ visitor: updateVisitorTable }, { onOpen: updateVisitorTable });
+
     startBtn.addEventListener('click', function() {
         console.log('Start Monitoring button clicked');
         if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
@@ -142,6 +135,10 @@ document.addEventListener('DOMContentLoaded', function() {
         stopBtn.addEventListener('click', () => {
             console.log('Stop Monitoring button clicked');
             clearInterval(intervalId);
+            if (frameStream) {
+                frameStream.close();
+                frameStream = null;
+            }
             if (stream) {
                 stream.getTracks().forEach(track => track.stop());
                 video.srcObject.over = null;
@@ -155,6 +152,51 @@ document.addEventListener('DOMContentLoaded', function() {
         console.error('Stop Monitoring button not found');
     }
 
+    function showResult(data) {
+        console.log('Monitoring response:', data);
+        const statusClass = data.status === 'success' ? 'text-success' : data.status === 'warming_up' ? 'text-info' : 'text-danger';
+        statusDiv.innerHTML = data.message
+            .split('; ')
+            .map(msg => `<div class="${statusClass}">${msg}</div>`)
+            .join('');
+        if (data.debug_image && data.debug_image !== lastDebugImage) {
+            lastDebugImage = data.debug_image;
+            const timestamp = new Date().getTime();
+            const debugOverlay = document.getElementById('debugOverlay');
+            debugOverlay.src = data.debug_image + `?t=${timestamp}`;
+            debugOverlay.style.display = 'block';
+        }
+        // New rows are pushed over live events; without them, refresh the table at most every 8 seconds
+        if (!live.connected && data.status === 'success' && Date.now() - lastTableUpdate >= POST_INTERVAL_MS) {
+            lastTableUpdate = Date.now();
+            updateVisitorTable();
+        }
+    }
+
+    function postFrame(blob) {
+        const formData = new FormData();
+        formData.append('image', blob, 'frame.jpg');
+        formData.append('camera_id', cameraId);
+
+        console.log('Sending image to /process_intrusion');
+        fetch('/process_intrusion', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => {
+            // 503 carries a JSON "warming_up" status while the models load
+            if (!response.ok && response.status !== 503) {
+                throw new Error(`HTTP error! Status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(showResult)
+        .catch(err => {
+            console.error('Process monitoring error:', err);
+            statusDiv.innerHTML = `<div class="text-danger">Error: ${err.message}</div>`;
+        });
+    }
+
     function processMonitoring() {
         console.log('Starting monitoring processing...');
         const canvas = document.createElement('canvas');
@@ -162,52 +204,32 @@ document.addEventListener('DOMContentLoaded', function() {
         canvas.height = video.videoHeight || 240;
         const ctx = canvas.getContext('2d');
 
-        intervalId = setInterval(() => {
-            ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-            canvas.toBlob(blob => {
-                const formData = new FormData();
-                formData.append('image', blob, 'frame.jpg');
-
-                console.log('Sending image to /process_intrusion');
-                fetch('/process_intrusion', {
-                    method: 'POST',
-                    body: formData
-                })
-                .then(response => {
-                    if (!response.ok) {
-                        throw new Error(`HTTP error! Status: ${response.status}`);
-                    }
-                    return response.json();
-                })
-                    .then(data => {
-                    console.log('Monitoring response:', data);
-                    const statusClass = data.status === 'success' ? 'text-success' : 'text-danger';
-                    statusDiv.innerHTML = data.message
-                        .split('; ')
-                        .map(msg => `<div class="${statusClass}">${msg}</div>`)
-                        .join('');
-                    if (data.debug_image && data.debug_image !== lastDebugImage) {
-                        lastDebugImage = data.debug_image;
-                        const timestamp = new Date().getTime();
-                        const debugOverlay = document.getElementById('debugOverlay');
-                        debugOverlay.src = data.debug_image + `?t=${timestamp}`;
-                        debugOverlay.style.display = 'block';
-                    }
-                    if (data.status === 'success') {
-                        updateVisitorTable();
-                    }
-                })
-                .catch(err => {
-                    console.error('Process monitoring error:', err);
-                    statusDiv.innerHTML = `<div class="text-danger">Error: ${err.message}</div>`;
-                });
-            }, 'image/jpeg', 0.9);
-        }, 8000);
-    }
+        function captureEvery(interval, send) {
+            clearInterval(intervalId);
+            intervalId = setInterval(() => {
+                ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+                canvas.toBlob(send, 'image/jpeg', 0.9);
+            }, interval);
+        }
 
-    // Periodically refresh table every 30 seconds
-    setInterval(updateVisitorTable, 30000);
+        function fallBackToPosts() {
+            frameStream = null;
+            if (video.srcObject) {
+                console.warn('Frame stream unavailable, sending frames as POST requests');
+                captureEvery(POST_INTERVAL_MS, postFrame);
+            }
+        }
+
+        frameStream = openFrameStream('intrusion', cameraId, {
+            onOpen: () => captureEvery(STREAM_INTERVAL_MS, blob => frameStream && frameStream.send(blob)),
+            onResult: showResult,
+            onUnavailable: fallBackToPosts,
+            onClose: fallBackToPosts
+        });
+    }
 
-    // Initial table load
-    updateVisitorTable();
+    // Pull new visitors every 30 seconds only while live events are unavailable
+    setInterval(() => {
+        if (!live.connected) updateVisitorTable();
+    }, 30000);
 });
\ No newline at end of file
@@ -0,0 +1,34 @@
+// Subscribes to /live_events, the server-sent events pushed as recognition rows are committed,
+// so dashboards update without polling. handlers maps a topic (attendance, visitor, breach,
+// stats) to a function taking the event's data. onOpen runs on every (re)connect: anything
+// pushed while disconnected was missed, so pages reload what they show there.
+// The returned object's connected flag lets pages keep a slow fallback poll for when it is down.
+function subscribeLiveEvents(handlers, options = {}) {
+    const live = { connected: false, source: null };
+    if (!('EventSource' in window)) {
+        console.warn('EventSource not supported, falling back to polling');
+        return live;
+    }
+    const topics = Object.keys(handlers);
+    const source = new EventSource(`/live_events?topics=${encodeURIComponent(topics.join(','))}`);
+    live.source = source;
+
+    source.onopen = () => {
+        live.connected = true;
+        if (options.onOpen) options.onOpen();
+    };
+    source.onerror = () => {
+        // The browser retries on its own; until then pages fall back to polling
+        live.connected = false;
+    };
+    topics.forEach(topic => {
+        source.addEventListener(topic, message => {
+            try {
+                handlers[topic](JSON.parse(message.data));
+            } catch (err) {
+                console.error(`Invalid ${topic} live event:`, err);
+            }
+        });
+    });
+    return live;
+}
@@ -0,0 +1,177 @@
+import json
+import logging
+import struct
+import threading
+import time
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+class FrameTooLarge(Exception):
+    pass
+
+
+class FrameDecoder:
+    """Splits a byte stream into frames, each sent as a 4-byte big-endian length and the JPEG bytes."""
+
+    def __init__(self, max_frame_bytes=4 * 1024 * 1024):
+        self.max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        frames = []
+        while len(self._buffer) >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self._buffer)
+            if length > self.max_frame_bytes:
+                raise FrameTooLarge(f"Frame of {length} bytes exceeds {self.max_frame_bytes}")
+            end = FRAME_HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            frames.append(bytes(self._buffer[FRAME_HEADER.size:end]))
+            del self._buffer[:end]
+        return frames
+
+
+class LatestFrame:
+    """Single-slot mailbox: a frame that has not been taken yet is replaced by the next one."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._closed = False
+
+    def put(self, frame):
+        """Store the frame; returns True if it displaced one that was never processed."""
+        with self._cond:
+            dropped = self._frame is not None
+            self._frame = frame
+            self._cond.notify()
+            return dropped
+
+    def take(self):
+        """Block for the next frame; returns None once closed."""
+        with self._cond:
+            while self._frame is None and not self._closed:
+                self._cond.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamSession:
+    """One camera's streaming connection.
+
+    The connection thread feeds raw bytes in; a worker thread runs the frame
+    handler on whatever frame is newest and sends the JSON result back. While
+    inference is busy, incoming frames overwrite each other, so a slow model
+    costs frame rate rather than a growing backlog.
+    """
+
+    def __init__(self, key, handler, send, ready=None, not_ready_payload=None, max_frame_bytes=4 * 1024 * 1024):
+        self.key = key
+        self.handler = handler
+        self.send = send
+        self.ready = ready
+        self.not_ready_payload = not_ready_payload
+        self.decoder = FrameDecoder(max_frame_bytes)
+        self.slot = LatestFrame()
+        self.opened = time.time()
+        self.stats = {'received': 0, 'processed': 0, 'dropped': 0, 'errors': 0, 'processing_total': 0.0}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._thread = threading.Thread(target=self._run, name=f'stream-{key}', daemon=True)
+        self._thread.start()
+
+    def feed(self, data):
+        frames = self.decoder.feed(data)
+        dropped = 0
+        for frame in frames:
+            self._seq += 1
+            dropped += self.slot.put((self._seq, frame))
+        with self._lock:
+            self.stats['received'] += len(frames)
+            self.stats['dropped'] += dropped
+
+    def _run(self):
+        while True:
+            item = self.slot.take()
+            if item is None:
+                return
+            seq, frame = item
+            started = time.time()
+            try:
+                if self.ready is not None and not self.ready():
+                    payload = dict(self.not_ready_payload or {"status": "warming_up"})
+                else:
+                    payload, _ = self.handler(frame)
+            except Exception as e:
+                logging.error(f"Stream {self.key} frame {seq} failed: {str(e)}")
+                payload = {"status": "error", "message": str(e)}
+                with self._lock:
+                    self.stats['errors'] += 1
+            elapsed = time.time() - started
+            with self._lock:
+                self.stats['processed'] += 1
+                self.stats['processing_total'] += elapsed
+                payload['frame'] = seq
+                payload['frames_dropped'] = self.stats['dropped']
+            try:
+                self.send(json.dumps(payload))
+            except Exception as e:
+                logging.debug(f"Stream {self.key} closed while sending: {str(e)}")
+                self.slot.close()
+                return
+
+    def close(self):
+        self.slot.close()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+        processed = stats.pop('processing_total')
+        stats['avg_processing_ms'] = round(1000 * processed / stats['processed'], 2) if stats['processed'] else 0
+        stats['open_seconds'] = round(time.time() - self.opened, 1)
+        return stats
+
+
+class StreamHub:
+    """Keeps track of open stream sessions for status reporting."""
+
+    def __init__(self, max_frame_bytes=4 * 1024 * 1024):
+        self.max_frame_bytes = max_frame_bytes
+        self._lock = threading.Lock()
+        self._sessions = set()
+        self._closed = {'closed_sessions': 0, 'received': 0, 'processed': 0, 'dropped': 0}
+
+    def open(self, key, handler, send, **options):
+        session = StreamSession(key, handler, send, max_frame_bytes=self.max_frame_bytes, **options)
+        with self._lock:
+            self._sessions.add(session)
+        return session
+
+    def close(self, session):
+        session.close()
+        stats = session.metrics()
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+                self._closed['closed_sessions'] += 1
+                for name in ('received', 'processed', 'dropped'):
+                    self._closed[name] += stats[name]
+
+    def metrics(self):
+        with self._lock:
+            sessions = list(self._sessions)
+            totals = dict(self._closed)
+        live = {}
+        for session in sessions:
+            stats = session.metrics()
+            live[':'.join(session.key)] = stats
+            for name in ('received', 'processed', 'dropped'):
+                totals[name] += stats[name]
+        return {'open': live, 'totals': totals}
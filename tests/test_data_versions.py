@@ -0,0 +1,26 @@
+import sqlite3
+
+from migrations import data_version, migrate
+
+
+def connect():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    migrate(conn)
+    return conn
+
+
+def test_repeat_sighting_keeps_version():
+    conn = connect()
+    conn.execute("INSERT INTO visitors (timestamp, photo_path, status) VALUES ('2026-10-17 10:00:00', 'a.jpg', 'Visitor')")
+    before = data_version(conn, ('visitors',))
+    # What update_sighting writes for a repeat sighting that brought no better photo
+    conn.execute("UPDATE visitors SET last_seen = '2026-10-17 10:00:05', seen_count = 2, photo_path = 'a.jpg' WHERE id = 1")
+    assert data_version(conn, ('visitors',)) == before
+
+
+def test_rendered_change_bumps_version():
+    conn = connect()
+    conn.execute("INSERT INTO geo_fence (timestamp, photo_path, status) VALUES ('2026-10-17 10:00:00', 'a.jpg', 'Zone Breach')")
+    before = data_version(conn, ('geo_fence',))
+    conn.execute("UPDATE geo_fence SET seen_count = 2, photo_path = 'b.jpg' WHERE id = 1")
+    assert data_version(conn, ('geo_fence',)) == (before[0] + 1,)
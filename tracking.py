@@ -0,0 +1,126 @@
+import itertools
+import threading
+import time
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    __slots__ = ('track_id', 'box', 'embedded_box', 'embedding', 'matches', 'last_seen', 'embedded_at', 'hits')
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.embedded_box = None
+        self.embedding = None
+        self.matches = None
+        self.last_seen = now
+        self.embedded_at = None
+        self.hits = 0
+
+
+class FaceTracker:
+    """Associates face boxes across frames of one camera session.
+
+    Boxes are matched to live tracks greedily by IoU. A track keeps the
+    embedding and gallery matches from the last time it was embedded, and only
+    needs a fresh embedding when it is new, its box has drifted below
+    reembed_iou against the box it was embedded at, reverify_seconds have
+    passed, or it went unseen for more than max_gap_seconds (at a low frame
+    rate, overlap says nothing about whether it is the same face). Tracks not
+    seen for ttl_seconds are dropped.
+    """
+
+    def __init__(self, match_iou=0.3, reembed_iou=0.6, ttl_seconds=2, reverify_seconds=30, max_gap_seconds=1):
+        self.match_iou = match_iou
+        self.reembed_iou = reembed_iou
+        self.ttl = ttl_seconds
+        self.max_gap = max_gap_seconds
+        self.reverify = reverify_seconds
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.tracks = []
+        self.last_used = time.time()
+
+    def assign(self, boxes):
+        """Return one (track, needs_embedding) pair per box, in box order."""
+        now = time.time()
+        with self._lock:
+            self.last_used = now
+            self.tracks = [t for t in self.tracks if now - t.last_seen <= self.ttl]
+            pairs = sorted(
+                ((box_iou(box, track.box), b, t) for b, box in enumerate(boxes) for t, track in enumerate(self.tracks)),
+                reverse=True,
+            )
+            owner = {}
+            taken = set()
+            for iou, b, t in pairs:
+                if iou < self.match_iou:
+                    break
+                if b in owner or t in taken:
+                    continue
+                owner[b] = self.tracks[t]
+                taken.add(t)
+            result = []
+            for b, box in enumerate(boxes):
+                track = owner.get(b)
+                if track is None:
+                    track = Track(next(self._ids), box, now)
+                    self.tracks.append(track)
+                gap = now - track.last_seen
+                track.box = box
+                track.last_seen = now
+                track.hits += 1
+                stale = (track.embedding is None
+                         or box_iou(box, track.embedded_box) < self.reembed_iou
+                         or now - track.embedded_at >= self.reverify
+                         or gap > self.max_gap)
+                result.append((track, stale))
+            return result
+
+    def remember(self, track, embedding, matches):
+        track.embedded_box = track.box
+        track.embedding = embedding
+        track.matches = matches
+        track.embedded_at = time.time()
+
+
+class TrackerRegistry:
+    """One FaceTracker per (route, camera) session, with idle sessions expired."""
+
+    def __init__(self, idle_seconds=600, **tracker_options):
+        self.idle = idle_seconds
+        self.tracker_options = tracker_options
+        self._lock = threading.Lock()
+        self._trackers = {}
+        self.stats = {'faces': 0, 'embedded': 0, 'skipped': 0}
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            for stale_key in [k for k, t in self._trackers.items() if now - t.last_used > self.idle]:
+                del self._trackers[stale_key]
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = FaceTracker(**self.tracker_options)
+            return tracker
+
+    def record(self, faces, embedded):
+        with self._lock:
+            self.stats['faces'] += faces
+            self.stats['embedded'] += embedded
+            self.stats['skipped'] += faces - embedded
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats, sessions=len(self._trackers))
+        stats['skip_ratio'] = round(stats['skipped'] / stats['faces'], 3) if stats['faces'] else 0
+        return stats
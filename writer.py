@@ -0,0 +1,210 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+
+
+class WriterQueueFull(Exception):
+    pass
+
+
+class EventWriter:
+    """Write-behind queue for event rows, committed in groups by one background thread.
+
+    submit() queues one frame's writes: a list of callables that each take a
+    cursor and run their statements. The writer thread takes the first waiting
+    frame, keeps collecting for up to max_delay_ms or until max_batch writes
+    are queued, and applies them all in one transaction. If that transaction
+    fails, each frame is retried on its own so a bad record only loses itself.
+
+    durability is 'async' (submit returns once queued; a crash can lose what
+    has not been committed yet, at most one batch window) or 'sync' (submit
+    waits for the commit, which is still shared with concurrent frames).
+
+    A frame can also name futures its ops depend on, such as files the rows
+    will point at. The writer waits for those (up to after_timeout) before it
+    opens the transaction, so the transaction itself only ever runs SQL.
+
+    on_commit, if given, is called on the writer thread with the connection
+    after every batch that committed something, so followers of the tables
+    only ever see rows that are readable.
+    """
+
+    def __init__(self, database, max_batch=200, max_delay_ms=50, max_queue=2000, durability='async', put_timeout=5,
+                 after_timeout=5, on_commit=None):
+        if durability not in ('async', 'sync'):
+            raise ValueError(f"Unknown durability setting: {durability}")
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.durability = durability
+        self.put_timeout = put_timeout
+        self.after_timeout = after_timeout
+        self.on_commit = on_commit
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'writes': 0,
+            'batches': 0,
+            'failed': 0,
+            'rejected': 0,
+            'max_batch_seen': 0,
+            'max_queue_depth': 0,
+            'queue_wait_total': 0.0,
+            'after_wait_total': 0.0,
+            'after_timeouts': 0,
+            'commit_total': 0.0,
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, ops, on_error=None, after=()):
+        """Queue ops to run in one transaction; returns a Future resolved once they are committed.
+
+        Blocks for up to put_timeout while the queue is full, then raises WriterQueueFull.
+        on_error is called with the exception if the ops are finally rolled back.
+        after is a list of futures to wait for before the transaction starts; the ops run
+        even if one of them failed or is still pending after after_timeout.
+        """
+        self.start()
+        future = Future()
+        try:
+            self._queue.put((list(ops), on_error, future, time.time(), list(after)), timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise WriterQueueFull("Event writer queue is full, writes dropped")
+        with self._stats_lock:
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+        if self.durability == 'sync':
+            future.result()
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted before this call is committed (or has failed)."""
+        future = self.submit([])
+        future.result(timeout=timeout)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        writes = len(pending[0][0])
+        deadline = time.time() + self.max_delay
+        while writes < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            writes += len(item[0])
+        return pending, writes
+
+    def _apply(self, conn, pending):
+        cursor = conn.cursor()
+        for ops, _, _, _, _ in pending:
+            for op in ops:
+                op(cursor)
+        conn.commit()
+
+    def _wait_after(self, pending):
+        futures = [f for item in pending for f in item[4]]
+        if not futures:
+            return 0.0
+        started = time.time()
+        _, not_done = wait(futures, timeout=self.after_timeout)
+        if not_done:
+            logging.warning(f"Event writer gave up waiting for {len(not_done)} dependencies after {self.after_timeout}s")
+            with self._stats_lock:
+                self._stats['after_timeouts'] += len(not_done)
+        return time.time() - started
+
+    def _committed(self, conn):
+        try:
+            self.on_commit(conn)
+        except Exception as e:
+            logging.error(f"Event writer commit callback failed: {str(e)}")
+
+    def _run(self):
+        while True:
+            pending, writes = self._collect()
+            # Outside the transaction, so a slow dependency never holds the write lock
+            after_wait = self._wait_after(pending)
+            started = time.time()
+            conn = self.database.connect()
+            failed = 0
+            outcomes = []
+            try:
+                self._apply(conn, pending)
+                outcomes = [None] * len(pending)
+            except Exception as e:
+                conn.rollback()
+                logging.error(f"Event batch of {len(pending)} frames failed, retrying one by one: {str(e)}")
+                outcomes = []
+                for item in pending:
+                    try:
+                        self._apply(conn, [item])
+                        outcomes.append(None)
+                    except Exception as item_error:
+                        conn.rollback()
+                        failed += 1
+                        outcomes.append(item_error)
+            finally:
+                if self.on_commit is not None and None in outcomes:
+                    self._committed(conn)
+                conn.close()
+            elapsed = time.time() - started
+            for (ops, on_error, future, _, _), error in zip(pending, outcomes):
+                if error is None:
+                    future.set_result(None)
+                    continue
+                logging.error(f"Dropped {len(ops)} event writes: {str(error)}")
+                if on_error is not None:
+                    try:
+                        on_error(error)
+                    except Exception as callback_error:
+                        logging.error(f"Event writer error callback failed: {str(callback_error)}")
+                future.set_exception(error)
+            with self._stats_lock:
+                self._stats['writes'] += writes
+                self._stats['batches'] += 1
+                self._stats['failed'] += failed
+                self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], writes)
+                self._stats['queue_wait_total'] += sum(started - queued for _, _, _, queued, _ in pending)
+                self._stats['after_wait_total'] += after_wait
+                self._stats['commit_total'] += elapsed
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        return {
+            'durability': self.durability,
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': stats['max_queue_depth'],
+            'submitted': stats['submitted'],
+            'writes': stats['writes'],
+            'batches': batches,
+            'failed': stats['failed'],
+            'rejected': stats['rejected'],
+            'avg_batch_size': round(stats['writes'] / batches, 2) if batches else 0,
+            'max_batch_size': stats['max_batch_seen'],
+            'avg_queue_wait_ms': round(1000 * stats['queue_wait_total'] / stats['submitted'], 2) if stats['submitted'] else 0,
+            'avg_after_wait_ms': round(1000 * stats['after_wait_total'] / batches, 2) if batches else 0,
+            'after_timeouts': stats['after_timeouts'],
+            'avg_commit_ms': round(1000 * stats['commit_total'] / batches, 2) if batches else 0,
+            'max_batch': self.max_batch,
+            'max_delay_ms': self.max_delay * 1000,
+        }